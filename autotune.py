@@ -0,0 +1,174 @@
+"""
+Pick the executor and concurrency of a task by measuring them.
+
+Every (executor, max_threads) pair is tried in a short closed-loop trial:
+runs are started as soon as a slot is free, so the achieved throughput is
+the most that configuration can do. The client CPU used per run is
+measured too, since a configuration that saturates the load generator
+hides the latency of the system under test.
+
+Every trial runs in its own forked process, so tasks whose setup()
+monkey-patches with gevent don't turn the following threaded trials into
+greenlets, and every trial starts from the same process state.
+"""
+from __future__ import division
+import sys
+import signal
+import logging
+import traceback
+import multiprocessing
+from collections import namedtuple
+
+import prettytable
+
+from .benchmark import _create_executor, PumbaException
+from .feeders import FeederExhausted
+from .resources import cpu_time
+from . import runtime_flags
+
+log = logging.getLogger(__name__)
+
+EXECUTORS = ("multithreading", "gevent")
+CONCURRENCY = (10, 50, 100, 500, 1000)
+# throughputs within this ratio of the best are considered as good
+TOLERANCE = 0.05
+
+Trial = namedtuple("Trial", ("executor",
+                             "max_threads",
+                             "throughput",
+                             "avg_run_time",
+                             "failed_ratio",
+                             "cpu",
+                             "cpu_per_run"))
+
+
+def tuned_task(task, executor, max_threads):
+    """Subclass of `task` with the given executor and concurrency."""
+    return type(task.__name__, (task,), {"executor": executor,
+                                         "max_threads": max_threads,
+                                         "__module__": task.__module__})
+
+
+def run_trial(task, executor, max_threads, duration=1.0, warmup=0.2):
+    """
+    Run `task` as fast as `max_threads` slots of `executor` allow for
+    `duration` seconds. Runs started during the first `warmup` seconds are
+    not measured.
+    """
+    e = _create_executor(tuned_task(task, executor, max_threads))
+    e.start()
+    cpu_start = cpu_time()
+    try:
+        while e.running_time < duration and not runtime_flags.exit.is_set():
+            if e.wait_available(0.1):
+                e.async_run_task()
+    except FeederExhausted:
+        log.warning("Feeder of %s exhausted during the trial" % task.__name__)
+    elapsed = e.running_time
+    cpu = cpu_time() - cpu_start
+    e.join(getattr(task, "drain_timeout", None) or sys.maxint)
+    e.finish()
+
+    stats = e.stats.general_stats(warmup, elapsed)
+    ok_runs = stats.finished_runs - stats.failed_runs
+    return Trial(executor=executor,
+                 max_threads=max_threads,
+                 throughput=ok_runs / max(elapsed - warmup, 1e-9),
+                 avg_run_time=stats.avg_run_time,
+                 failed_ratio=stats.failed_ratio,
+                 cpu=cpu / elapsed,
+                 cpu_per_run=cpu / e._n_runs if e._n_runs else None)
+
+
+def _trial_child(conn, task, executor, max_threads, duration, warmup):
+    stop = lambda signum, frame: runtime_flags.exit.set()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, stop)
+    try:
+        result = run_trial(task, executor, max_threads, duration, warmup)
+    except Exception:
+        result = traceback.format_exc()
+    conn.send(result)
+    conn.close()
+
+
+def run_forked_trial(task, executor, max_threads, duration=1.0, warmup=0.2):
+    """`run_trial` in a child process. Returns None if the trial failed."""
+    recv, send = multiprocessing.Pipe(False)
+    p = multiprocessing.Process(target=_trial_child,
+                                args=(send, task, executor, max_threads,
+                                      duration, warmup))
+    p.daemon = True
+    p.start()
+    send.close()
+    try:
+        result = recv.recv()
+    except EOFError:
+        result = None
+    p.join()
+    if result is None:
+        result = "Trial process exited with code %s" % p.exitcode
+    if isinstance(result, Trial):
+        return result
+    log.error("Trial of %s with %s x%d failed:\n%s"
+              % (task.__name__, executor, max_threads, result))
+    return None
+
+
+def best_trial(trials, max_failed_ratio=0.01, tolerance=TOLERANCE):
+    """
+    The trial with the highest throughput, among those failing at most
+    `max_failed_ratio` of the runs. Trials within `tolerance` of it are
+    as good: the one using the least client CPU per run wins, then the
+    one with the lowest concurrency.
+    """
+    ok = [t for t in trials if t.failed_ratio <= max_failed_ratio and t.throughput > 0]
+    if not ok:
+        return None
+    top = max(t.throughput for t in ok)
+    good = [t for t in ok if t.throughput >= top * (1 - tolerance)]
+    return min(good, key=lambda t: (t.cpu_per_run, t.max_threads))
+
+
+def autotune(task, executors=EXECUTORS, concurrency=CONCURRENCY,
+             trial_duration=1.0, max_failed_ratio=0.01):
+    """
+    Try `task` with every executor and concurrency level. Returns
+    (best trial, all trials); the best is None if every trial failed.
+    """
+    if task.executor not in EXECUTORS:
+        raise PumbaException("Can't autotune tasks with the `%s` executor"
+                             % task.executor)
+    trials = []
+    for executor in executors:
+        for n in concurrency:
+            if runtime_flags.exit.is_set():
+                break
+            trial = run_forked_trial(task, executor, n, trial_duration)
+            log.debug("%r" % (trial,))
+            if trial is not None:
+                trials.append(trial)
+    return best_trial(trials, max_failed_ratio), trials
+
+
+def format_trials(task_name, best, trials):
+    cols = ["executor", "max_threads", "RPS", "Avg (ms)", "Failed", "Client CPU",
+            "CPU/run (us)"]
+    t = prettytable.PrettyTable(cols, padding_width=2, border=False)
+    t.align = "r"
+    t.float_format = "0.2"
+    for trial in trials:
+        t.add_row([("* " if trial is best else "") + trial.executor,
+                   trial.max_threads,
+                   trial.throughput,
+                   trial.avg_run_time * 1000,
+                   "%d%%" % (trial.failed_ratio * 100),
+                   "%d%%" % (trial.cpu * 100),
+                   trial.cpu_per_run * 1e6 if trial.cpu_per_run is not None else "-"])
+    l = ["Autotune of %s\n" % task_name, t.get_string()]
+    if best is None:
+        l.append("\nNo configuration ran without failures")
+    else:
+        l.append("\nBest: executor = %r, max_threads = %d"
+                 % (best.executor, best.max_threads))
+    return "\n".join(l)
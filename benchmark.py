@@ -1,4 +1,6 @@
+import sys
 import time
+import signal
 import prettytable
 import logging
 import threading
@@ -9,9 +11,25 @@ import shutil
 import numpy
 import itertools
 import math
+import multiprocessing
+import traceback
 
 from executors.multithreading_core import MultithreadingExecutor
-from executors.gevent_core import GeventExecutor
+from executors.gevent_core import GeventExecutor, GeventSessionExecutor
+from executors.micro_core import MicroExecutor
+from executors.process_core import RemoteExecutor
+from executors.shm_ring import RunRing
+from .binary_results import ResultsWriter
+from . import downsample
+from .replay import ReplayReader
+from .feeders import FeederExhausted
+from . import runtime_flags
+from .resources import ResourceSampler
+from .profiler import SamplingProfiler
+from .summary import benchmark_summary, write_summary
+from .catalog import record_benchmark
+from .cpus import available_cpus, set_affinity, split_cpus
+from .schedule import Schedule
 
 log = logging.getLogger(__name__)
 
@@ -37,6 +55,10 @@ def _create_executor(task):
             executor = GeventExecutor(task,
                                       task.max_threads,
                                       task.multiple_instances)
+        elif task.executor == "sessions":
+            executor = GeventSessionExecutor(task)
+        elif task.executor == "micro":
+            executor = MicroExecutor(task, getattr(task, "batch_time", 0.01))
         else:
             raise PumbaException("Invalid executor type `%s`" % task.executor)
         return executor
@@ -44,17 +66,30 @@ def _create_executor(task):
 
 class _SingleBenchmark(object):
 
-    def __init__(self, task, duration, terminal=True):
+    # default load: a linear ramp over the duration, unless the task has a
+    # constant `rate`
+    START_RPS = 0
+    END_RPS = 1000
+
+    def __init__(self, task, duration, terminal=True, metrics_sinks=()):
         self.task = task
         self.duration = duration
         self.interval = 1.0
         self.terminal = terminal
+        self.metrics_sinks = metrics_sinks
 
         self._running = False
         self._stop_flag = False
         self._start_time = None
         self._executor = None
         self._timer = None
+        self.profiler = None
+        # seconds spent dispatching runs, without the final drain
+        self.dispatch_time = None
+        # RunRing to also write the runs to, when run in a child process
+        self.ring = None
+        # schedule.Schedule of deterministic runs, see `_create_schedule`
+        self.schedule = None
 
     def start(self):
         log.debug("Starting benchmark of %s" % self.task)
@@ -62,54 +97,214 @@ class _SingleBenchmark(object):
         self._start_time = time.time()
         self._executor = _create_executor(self.task)
         self._executor.start()
+        if self.ring is not None:
+            self._executor.ring = self.ring
+            self.ring.start_time = self._executor._start_time
+        self.schedule = self._create_schedule()
+        self._executor.schedule = self.schedule
+        self.resources = ResourceSampler(self._executor)
+        self.resources.start()
+        if getattr(self.task, "profile_hz", None):
+            self.profiler = SamplingProfiler(self.task.profile_hz,
+                                             getattr(self.task, "profile_mode",
+                                                     "thread")).start()
 
         self._timer = threading.Timer(self.interval, self._report_data)
         self._timer.daemon = False
         self._timer.start()
-        self._run()
+        try:
+            self._run()
+        finally:
+            self._executor.finish()
+            self._running = False
+            self._timer.cancel()
+            self.resources.stop()
+            if self.profiler is not None:
+                self.profiler.stop()
+
+    def start_mirror(self, ring):
+        """
+        Follow, from the parent, this benchmark running in a child process
+        that writes its runs to `ring`.
+        """
+        self._running = True
+        self._start_time = time.time()
+        self._executor = RemoteExecutor(self.task, ring)
+        self.resources = ResourceSampler(self._executor)
 
-        self._executor.finish()
+    def finish_mirror(self, child_results):
+        """Apply what the child sent back once done, see `_run_child`."""
         self._running = False
+        self._executor.drain()
+        self._executor.finish()
+        if "error" in child_results:
+            log.error("Benchmark of %s failed:\n%s"
+                      % (self.task.__name__, child_results["error"]))
+            return
+        self.dispatch_time = child_results["dispatch_time"]
+        self.resources.samples = child_results["resources"]
+        self.schedule = child_results["schedule"]
+        for name, value in child_results["executor"].iteritems():
+            setattr(self._executor, name, value)
+        if child_results["profile"] is not None:
+            self.profiler = SamplingProfiler(self.task.profile_hz,
+                                             getattr(self.task, "profile_mode",
+                                                     "thread"))
+            self.profiler.stacks, self.profiler.samples = child_results["profile"]
 
     def _run(self):
-        START_RPS = 0
-        END_RPS = 1000
-        rps = START_RPS
+        try:
+            if self.task.executor == "sessions":
+                self._executor.run_sessions(self.duration, self._stopped)
+            elif self.task.executor == "micro":
+                self._executor.run_batches(self.duration, self._stopped)
+            elif getattr(self.task, "replay_log", None):
+                self._dispatch_replay()
+            elif self.schedule is not None:
+                self._dispatch_schedule()
+            elif isinstance(self._executor, GeventExecutor):
+                self._dispatch_gevent()
+            else:
+                self._dispatch_ramp()
+        except FeederExhausted:
+            log.debug("Feeder of %s exhausted, stopping" % self.task)
+        self.dispatch_time = time.time() - self._start_time
+
+        self._executor.join(getattr(self.task, "drain_timeout", None) or sys.maxint)
+        if self._stopped():
+            log.warning("Benchmark of %s stopped after %.1fs"
+                        % (self.task.__name__, time.time() - self._start_time))
+        log.debug("%r" % (self._executor.stats.general_stats(),))
+
+    def _target_rps(self, elapsed):
+        """Runs per second to dispatch after `elapsed` seconds."""
+        if getattr(self.task, "rate", None):
+            return self.task.rate
+        return (self.END_RPS-self.START_RPS) * elapsed / self.duration + self.START_RPS
+
+    def _create_schedule(self):
+        """Schedule of a task with a `seed` or a `schedule_file`, else None."""
+        if self.task.executor in ("sessions", "micro") or \
+           getattr(self.task, "replay_log", None):
+            return None
+        if getattr(self.task, "schedule_file", None):
+            schedule = Schedule.load(self.task.schedule_file)
+            log.debug("Loaded a schedule of %d runs for %s from %s"
+                      % (len(schedule), self.task.__name__, self.task.schedule_file))
+            return schedule
+        if getattr(self.task, "seed", None) is not None:
+            return Schedule.generate(self._target_rps, self.duration, self.task.seed,
+                                     getattr(self.task, "arrivals", "poisson"))
+        return None
+
+    def _dispatch_schedule(self):
+        offsets = self.schedule.offsets
+        offsets = offsets[:numpy.searchsorted(offsets, self.duration)]
+        start = time.time()
+        if isinstance(self._executor, GeventExecutor):
+            self._executor.dispatch_schedule(offsets, start, self._stopped)
+            return
+        for offset in offsets:
+            if self._stopped():
+                break
+            intended_time = start + offset
+            delay = intended_time - time.time()
+            if delay > 0 and runtime_flags.exit.wait(delay):
+                break
+            if not self._wait_available():
+                break
+            self._executor.async_run_task(intended_time)
+
+    def _dispatch_gevent(self):
+        self._executor.dispatch(self._target_rps, self._start_time, self.duration,
+                                self._stopped)
+
+    def _dispatch_ramp(self):
+        rps = self._target_rps(0.0)
 
         now = time.time()
         last_run = now
 
-        while now - self._start_time < self.duration and not self._stop_flag:
+        while now - self._start_time < self.duration and not self._stopped():
             now = time.time()
             runs_left = (now - last_run) * rps*1.05
+            intended_time = last_run
             while runs_left > 1.0:
-                self._executor.wait_available()
-                self._executor.async_run_task()
+                intended_time += 1.0 / (rps*1.05)
+                if not self._wait_available():
+                    return
+                self._executor.async_run_task(intended_time)
                 now = time.time()
                 last_run = now
                 runs_left -= 1.0
                 time.sleep(0.0)
-            p_dif = (now - self._start_time) / self.duration
-            rps = (END_RPS-START_RPS) * p_dif + START_RPS
+            rps = self._target_rps(now - self._start_time)
             #rps = abs(math.sin(math.radians(rps))) * END_RPS
             time.sleep(0.0)
 
-        self._executor.join()
-        log.debug("%r" % (self._executor.stats.general_stats(),))
+    def _dispatch_replay(self):
+        reader = ReplayReader(self.task.replay_log,
+                              getattr(self.task, "replay_time_field", "timestamp"),
+                              getattr(self.task, "replay_speed", 1.0)).start()
+        start = time.time()
+        try:
+            for offset, record in reader:
+                if offset >= self.duration or self._stopped():
+                    break
+                intended_time = start + offset
+                delay = intended_time - time.time()
+                if delay > 0 and runtime_flags.exit.wait(delay):
+                    break
+                if not self._wait_available():
+                    break
+                self._executor.async_run_task(intended_time, (record,))
+        finally:
+            reader.stop()
+
+    def stop(self):
+        self._stop_flag = True
+
+    def _stopped(self):
+        return self._stop_flag or runtime_flags.exit.is_set()
+
+    def _wait_available(self):
+        """Wait for a free slot in the executor, unless stopped."""
+        while not self._executor.wait_available(0.1):
+            if self._stopped():
+                return False
+        return True
 
     def _report_data(self):
+        sample = self.resources.sample()
+        if sample.saturated and not self.terminal:
+            log.warning("Load generator saturated: %r" % (sample,))
         if self.terminal:
             print "\033[H\033[J"
             print self._terminal_output()
-        else:
+        elif log.isEnabledFor(logging.DEBUG):
             log.debug(self._executor.stats.general_stats())
+        if self.metrics_sinks:
+            self._update_metrics()
         if self._running:
             self._timer = threading.Timer(self.interval, self._report_data)
             self._timer.start()
 
+    def _update_metrics(self):
+        end = self._executor.running_time
+        stats = self._executor.stats.general_stats(max(0.0, end-self.interval), end)
+        totals = {"submited_runs": self._executor._n_runs,
+                  "finished_runs": self._executor.nr_finished_runs(),
+                  "running_runs": self._executor.nr_running_runs()}
+        for sink in self.metrics_sinks:
+            try:
+                sink.update(self.task.__name__, stats, self.interval, totals)
+            except Exception:
+                log.debug("Metrics sink %r failed" % sink, exc_info=True)
+
     def _terminal_output(self):
         now = time.time()
-        cols = ("interval", "Count", "Failed", "Min", "Max", "Std Dev", "Avg")
+        cols = ("interval", "Count", "Failed", "Timeouts", "Min", "Max", "Std Dev", "Avg",
+                "Client CPU")
         t = prettytable.PrettyTable(cols, padding_width=5, border=False)
         t.align = "r"
         t.float_format = "0.3"
@@ -118,88 +313,284 @@ class _SingleBenchmark(object):
         l.append("------------------------------------\n")
         l.append("Stress test of %s\n\n" % self._executor.task_cls)
 
+        samples = self.resources.samples
         i = 0.0
+        n = 0
         while i < min(now-self._start_time, self.duration):
             stats = self._executor.stats.general_stats(i, i+self.interval)
+            client = ""
+            if n < len(samples):
+                client = "%d%%%s" % (samples[n].cpu*100,
+                                     " SATURATED" if samples[n].saturated else "")
             values = (i, stats.finished_runs,
                       "%d (%d%%)" % (stats.failed_runs, int(stats.failed_ratio*100)),
+                      stats.timeout_runs,
                       stats.min_run_time,
-                      stats.max_run_time,stats.std_dev_run_time, stats.avg_run_time,)
+                      stats.max_run_time,stats.std_dev_run_time, stats.avg_run_time,
+                      client)
             t.add_row(values)
             i += self.interval
+            n += 1
 
         stats = self._executor.stats.general_stats()
         values = ("Total", stats.finished_runs,
           "%d (%d%%)" % (stats.failed_runs, int(stats.failed_ratio*100)),
+          stats.timeout_runs,
           stats.min_run_time,
-          stats.max_run_time, stats.std_dev_run_time, stats.avg_run_time, )
+          stats.max_run_time, stats.std_dev_run_time, stats.avg_run_time, "")
         t.add_row(("-",)*len(cols))
         t.add_row(values)
+
+        for step, stats in self._executor.stats.steps_stats():
+            values = (step, stats.finished_runs,
+              "%d (%d%%)" % (stats.failed_runs, int(stats.failed_ratio*100)),
+              stats.timeout_runs,
+              stats.min_run_time,
+              stats.max_run_time, stats.std_dev_run_time, stats.avg_run_time, "")
+            t.add_row(values)
         l.append(t.get_string())
+
+        # batch_size is only known once calibrated, in parallel runs once done
+        if self.task.executor == "micro" and stats.finished_runs and \
+           self._executor.batch_size:
+            l.append("\nPer call: %.2fns avg, %.2fns std dev over %d batches of "
+                     "%d calls (%.2fns loop overhead subtracted)"
+                     % (stats.avg_run_time*1e9, stats.std_dev_run_time*1e9,
+                        stats.finished_runs, self._executor.batch_size,
+                        self._executor.loop_overhead /
+                        self._executor.batch_size * 1e9))
+
+        if samples:
+            s = samples[-1]
+            l.append("\nClient: CPU %d%%, RSS %.1fMB, %d threads, %d workers, "
+                     "%d running, dispatch lag %.1fms (max %.1fms)%s"
+                     % (s.cpu*100, s.rss/2.0**20, s.threads, s.workers,
+                        s.running_runs, s.dispatch_lag_avg*1000,
+                        s.dispatch_lag_max*1000,
+                        " - SATURATED" if s.saturated else ""))
         return "\n".join(l)
 
 
 
-class Benchmark(object):
-    EXPORT_FORMATS = ("html",)
+def _run_child(b, ring, cpus, conn):
+    """Run the `_SingleBenchmark` `b` in a child process."""
+    stop = lambda signum, frame: runtime_flags.exit.set()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, stop)
+    if cpus is not None:
+        set_affinity(cpus)
+    b.terminal = False
+    b.metrics_sinks = ()
+    b.ring = ring
+    try:
+        b.start()
+        profile = None
+        if b.profiler is not None:
+            profile = (dict(b.profiler.stacks), b.profiler.samples)
+        executor = b._executor
+        results = {"dispatch_time": b.dispatch_time,
+                   "resources": b.resources.samples,
+                   "profile": profile,
+                   "schedule": b.schedule,
+                   # executor specific, see RemoteExecutor.EXTRA_ATTRS
+                   "executor": dict((name, getattr(executor, name))
+                                    for name in RemoteExecutor.EXTRA_ATTRS
+                                    if hasattr(executor, name))}
+    except Exception:
+        results = {"error": traceback.format_exc()}
+    conn.send(results)
+    conn.close()
+
 
-    def __init__(self, tasks, duration, terminal=True):
+class Benchmark(object):
+    EXPORT_FORMATS = ("html", "npz", "traces", "profile", "summary", "schedule")
+    HTML_STATIC_FILES = ("exporting.js",
+                         "highcharts.js",
+                         "jquery.min.js",
+                         "bootstrap",
+                         "template.css")
+    HTML_STATIC_DIR = "pumba_static"
+
+    def __init__(self, tasks, duration, terminal=True, metrics_sinks=(),
+                 parallel=False, pin_cpus=True):
+        """
+        With `parallel`, every task is benchmarked at the same time in its
+        own process, pinned to its own share of the CPUs with `pin_cpus`.
+        Runs get back to this process through shared memory rings, so the
+        results are reported and exported together as usual.
+        """
         if type(tasks) not in (list, tuple):
             tasks = [tasks]
         self.tasks = tasks
         self.duration = duration
         self.terminal = terminal
-        self._benchmarks = [_SingleBenchmark(t, duration, terminal) for t in self.tasks]
-
-    def start(self):
+        self.metrics_sinks = metrics_sinks
+        self.parallel = parallel
+        self.pin_cpus = pin_cpus
+        self._benchmarks = [_SingleBenchmark(t, duration, terminal, metrics_sinks)
+                            for t in self.tasks]
+
+    def start(self, handle_signals=True):
+        """
+        Run the benchmarks. With `handle_signals`, SIGINT and SIGTERM stop
+        them gracefully: dispatching stops at once, in-flight runs are
+        drained for up to the task `drain_timeout` and the collected data
+        is kept for exporting. A second signal interrupts right away.
+        """
+        runtime_flags.exit.clear()
+        old_handlers = {}
+        if handle_signals and isinstance(threading.current_thread(),
+                                         threading._MainThread):
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                old_handlers[signum] = signal.signal(signum, self._on_signal)
+        for sink in self.metrics_sinks:
+            sink.start()
+        try:
+            if self.parallel:
+                self._start_parallel()
+            else:
+                for b in self._benchmarks:
+                    if runtime_flags.exit.is_set():
+                        break
+                    b.start()
+        finally:
+            for sink in self.metrics_sinks:
+                sink.stop()
+            for signum, handler in old_handlers.iteritems():
+                signal.signal(signum, handler)
+
+    def _start_parallel(self):
+        n = len(self._benchmarks)
+        if self.pin_cpus:
+            cpu_sets = split_cpus(available_cpus(), n)
+        else:
+            cpu_sets = [None] * n
+        children = []
+        for i, (b, cpus) in enumerate(zip(self._benchmarks, cpu_sets)):
+            ring = RunRing(worker=i)
+            recv, send = multiprocessing.Pipe(False)
+            p = multiprocessing.Process(target=_run_child,
+                                        args=(b, ring, cpus, send),
+                                        name="pumba-%s" % b.task.__name__)
+            p.daemon = True
+            p.start()
+            send.close()
+            log.debug("Benchmark of %s in process %d on CPUs %s"
+                      % (b.task.__name__, p.pid, cpus))
+            b.start_mirror(ring)
+            children.append([b, p, recv, None])
+
+        interval = self._benchmarks[0].interval
+        next_report = time.time() + interval
+        forwarded = False
+        while True:
+            running = 0
+            for child in children:
+                b, p, recv, results = child
+                b._executor.drain()
+                # read before joining, the child blocks until it's sent
+                if results is None and recv.poll():
+                    child[3] = recv.recv()
+                if p.is_alive():
+                    running += 1
+            if not running:
+                break
+            if runtime_flags.exit.is_set() and not forwarded:
+                # children also get terminal SIGINTs, but not signals sent
+                # to this process only
+                for _, p, _, _ in children:
+                    if p.is_alive():
+                        os.kill(p.pid, signal.SIGTERM)
+                forwarded = True
+            if time.time() >= next_report:
+                self._report_parallel()
+                next_report += interval
+            time.sleep(0.05)
+
+        for b, p, recv, results in children:
+            p.join()
+            if results is None:
+                results = recv.recv() if recv.poll() else \
+                    {"error": "Process exited with code %s" % p.exitcode}
+            b.finish_mirror(results)
+
+    def _report_parallel(self):
+        if self.terminal:
+            print "\033[H\033[J"
+            print "\n\n".join(b._terminal_output() for b in self._benchmarks)
         for b in self._benchmarks:
-            b.start()
-
-    def results(self, sample_interval=1.0):
+            if b._executor.started and self.metrics_sinks:
+                b._update_metrics()
+
+    def stop(self):
+        runtime_flags.exit.set()
+
+    def _on_signal(self, signum, frame):
+        if runtime_flags.exit.is_set():
+            raise KeyboardInterrupt()
+        log.warning("Got signal %d, stopping" % signum)
+        self.stop()
+
+    @property
+    def stopped(self):
+        return runtime_flags.exit.is_set()
+
+    def summary(self):
+        """Totals, throughput, latency percentiles and errors of every task."""
+        return benchmark_summary(self)
+
+    def results(self, sample_interval=1.0, max_points=downsample.MAX_POINTS):
+        """
+        Chart series of every task. The top level series are downsampled to
+        at most `max_points` points; the finer zoom levels, down to
+        `sample_interval`, are listed in "levels" (coarsest first).
+        """
         d = {}
         for b in self._benchmarks:
-            run_time = []
-            std_dev = []
-            maxs = []
-            failed = [(0.0, 0)]
-            runs = [(0.0, 0)]
-            for i, stat in b._executor.stats.intervals_stats(sample_interval,
-                                                             0.0,
-                                                             self.duration):
-                i = round(i, 2)
-                avg_time = round(stat.avg_run_time, 4)*1000
-                run_time.append((i, avg_time))
-                std_dev.append((i, round(stat.std_dev_run_time,4)*1000))
-                m = 0
-                iii = 0
-                for run in b._executor.runs_from_range(i, i+sample_interval):
-                    if run.result.exc is not None:
-                        # this run resulted in failure
-                        continue
-                    #if run.run_time > m and stat.std_dev_run_time / run.run_time > 0.5:
-                    if run.run_time > m:
-                        m = run.run_time
-                        iii = run.start_time
-                    #if stat.std_dev_run_time / stat.avg_run_time > 0.9:
-                    #    run_time.append((round(run.start_time,2), round(run.run_time,4)*1000))
-                if m != 0:
-                    maxs.append((round(iii,2), round(m,4)*1000))
-
-            for i, stat in b._executor.stats.intervals_stats(1.0,
-                                                             0.0,
-                                                             self.duration):
-                i = round(i+1.0, 2)
-                failed.append((i, stat.failed_runs))
-                runs.append((i, stat.submited_runs))
-
-            d[b.task.__name__] = {"avg_run_time": run_time,
-                                  "max_run_time": maxs,
-                                  "std_dev": std_dev,
-                                  "failed": failed,
-                                  "runs": runs}
+            d[b.task.__name__] = self._task_results(b, sample_interval,
+                                                    max_points)
         return d
 
-    def export(self, dir_path=None, formats=None, sample_frequency=None):
+    def _task_results(self, b, sample_interval, max_points):
+        agg = downsample.aggregate(duration=self.duration, step=sample_interval,
+                                   **b._executor.stats.runs_arrays())
+        levels = downsample.levels(agg, max_points)
+        # micro-benchmark run times are per call, far below a millisecond
+        digits = 6 if b.task.executor == "micro" else 1
+        results = downsample.series(levels[-1], digits)
+        results["levels"] = [{"step": l["step"],
+                              "series": downsample.series(l, digits)}
+                             for l in reversed(levels[:-1])]
+        results["max_points"] = max_points
+        results["client"] = {
+            "cpu": [(round(s.time, 2), round(s.cpu*100, 1))
+                    for s in b.resources.samples],
+            "saturated": b.resources.saturated_intervals(b.interval)}
+
+        steps = getattr(b.task, "steps", ())
+        if steps:
+            results["steps"] = {}
+            for step in steps:
+                agg = downsample.aggregate(duration=self.duration,
+                                           step=levels[-1]["step"],
+                                           **b._executor.stats.runs_arrays(step=step))
+                results["steps"][step] = downsample.series(agg)
+        return results
+
+    def export(self, dir_path=None, formats=None, sample_frequency=None,
+               shared_static=True, catalog=True):
+        """
+        Export the results to a new directory. If `dir_path` already exists
+        an auto-incremented suffix is appended to it.
+
+        With `shared_static` the HTML report references static assets
+        (highcharts, bootstrap, ...) from a `HTML_STATIC_DIR` directory next
+        to `dir_path`, copied only once, instead of bundling them in every
+        export.
+
+        The export is recorded in the results catalog (see catalog.py), at
+        its default path or at `catalog` if it's a path. False disables it.
+        """
         if formats is None:
             formats = self.EXPORT_FORMATS
         if type(formats) not in (list, tuple):
@@ -223,23 +614,107 @@ class Benchmark(object):
         os.mkdir(dir_path)
 
         for f in formats:
-            getattr(self, "_export_%s" % f)(dir_path, sample_interval)
-
-    def _export_html(self, dir_path, sample_interval):
-        files = ["exporting.js",
-                 "highcharts.js",
-                 "jquery.min.js",
-                 "bootstrap",
-                 "template.html",
-                 "template.css"]
-        for f in files:
-            path = os.path.join(os.path.dirname(__file__), "html", f)
-            dst = os.path.join(dir_path, f)
+            getattr(self, "_export_%s" % f)(dir_path, sample_interval,
+                                            shared_static=shared_static)
+        if catalog:
+            try:
+                record_benchmark(self, dir_path, sample_interval,
+                                 None if catalog is True else catalog)
+            except Exception:
+                log.warning("Couldn't record the export in the catalog",
+                            exc_info=True)
+        return dir_path
+
+    def _export_html(self, dir_path, sample_interval, shared_static=True):
+        html_dir = os.path.join(os.path.dirname(__file__), "html")
+        if shared_static:
+            static_dir = os.path.join(os.path.dirname(os.path.abspath(dir_path)),
+                                      self.HTML_STATIC_DIR)
+            static_prefix = "../%s/" % self.HTML_STATIC_DIR
+        else:
+            static_dir = dir_path
+            static_prefix = ""
+
+        for f in self.HTML_STATIC_FILES:
+            path = os.path.join(html_dir, f)
+            dst = os.path.join(static_dir, f)
+            if os.path.exists(dst):
+                continue
             if os.path.isdir(path):
                 shutil.copytree(path, dst)
             else:
+                if not os.path.isdir(static_dir):
+                    os.makedirs(static_dir)
                 shutil.copy(path, dst)
 
+        with open(os.path.join(html_dir, "template.html")) as f:
+            template = f.read()
+        with open(os.path.join(dir_path, "template.html"), "w") as f:
+            f.write(template.replace("{{static}}", static_prefix))
+
+        data = self._html_results(dir_path, sample_interval)
         results_js_path = os.path.join(dir_path, "results.js")
         with open(results_js_path, "w") as f:
-            f.write("var data = %s;" % json.dumps(self.results(sample_interval)))
+            f.write("var data = %s;" % json.dumps(data, separators=(",", ":")))
+
+    def _html_results(self, dir_path, sample_interval):
+        # finer zoom levels go to their own files, loaded by the report on zoom
+        data = self.results(sample_interval)
+        for task_name, results in data.iteritems():
+            for i, level in enumerate(results["levels"]):
+                level["file"] = "results.%s.%d.js" % (task_name, i)
+                with open(os.path.join(dir_path, level["file"]), "w") as f:
+                    f.write("data_levels[%s][%d] = %s;" % (
+                            json.dumps(task_name), i,
+                            json.dumps(level.pop("series"), separators=(",", ":"))))
+        return data
+
+    def _export_summary(self, dir_path, sample_interval, **kwargs):
+        write_summary(self.summary(), os.path.join(dir_path, "summary.json"))
+
+    def _export_traces(self, dir_path, sample_interval, **kwargs):
+        traces = {}
+        for b in self._benchmarks:
+            intervals = []
+            for i, slowest in b._executor.slow_runs.intervals(sample_interval,
+                                                              0.0,
+                                                              self.duration):
+                runs = []
+                for run in slowest:
+                    r = {"run_id": run.id,
+                         "start_time": run.start_time,
+                         "intended_start_time": run.intended_time,
+                         "run_time": run.run_time}
+                    if run.result.trace is not None:
+                        r["trace"] = run.result.trace.to_dict()
+                    runs.append(r)
+                if runs:
+                    intervals.append({"time": i, "slowest": runs})
+            traces[b.task.__name__] = {"start_time": b._executor._start_time,
+                                       "intervals": intervals}
+        with open(os.path.join(dir_path, "traces.json"), "w") as f:
+            json.dump(traces, f, indent=1)
+
+    def _export_profile(self, dir_path, sample_interval, **kwargs):
+        for b in self._benchmarks:
+            if b.profiler is not None:
+                path = os.path.join(dir_path, "profile.%s.folded" % b.task.__name__)
+                b.profiler.write_collapsed(path)
+
+    def _export_schedule(self, dir_path, sample_interval, **kwargs):
+        for b in self._benchmarks:
+            if b.schedule is not None:
+                b.schedule.save(os.path.join(dir_path,
+                                             "schedule.%s.npz" % b.task.__name__))
+
+    def _export_npz(self, dir_path, sample_interval, **kwargs):
+        path = os.path.join(dir_path, "results.npz")
+        with ResultsWriter(path, self.duration, sample_interval) as writer:
+            for b in self._benchmarks:
+                stats = b._executor.stats
+                writer.write_runs(b.task.__name__, b._executor.runs_from_range())
+                writer.write_intervals(b.task.__name__,
+                                       stats.intervals_stats(sample_interval,
+                                                             0.0,
+                                                             self.duration))
+                writer.write_resources(b.task.__name__, b.resources.samples)
@@ -0,0 +1,140 @@
+"""
+Compact columnar results file.
+
+The file is a regular numpy ``.npz`` archive (a zip of ``.npy`` members) so it
+can be opened with ``numpy.load``, but it is written chunk by chunk so raw runs
+never need to be materialized as a whole in memory. Members:
+
+  meta.json                           format version, duration, sample interval
+                                      and the number of run chunks per task
+  <task>/runs/<column>/<chunk>.npy    raw runs, CHUNK_SIZE rows per chunk
+  <task>/intervals/<column>.npy       per-interval aggregates
+  <task>/resources/<column>.npy       client resource samples
+
+Run columns are ``start_time`` and ``finish_time`` (float64, seconds since the
+benchmark start, NaN finish for unfinished runs), ``run_time`` (float64, NaN
+for failed or unfinished runs), ``failed`` (bool) and ``run_id`` (int64, the
+schedule index of scheduled runs).
+Interval columns are ``time`` plus every field of `GeneralStats`, resource
+columns the fields of `ResourceSample` (NaN where not available).
+
+Use `load_results` to get everything back as concatenated arrays.
+"""
+import io
+import json
+import zipfile
+import numpy
+
+from .stats import GeneralStats, runs_arrays
+from .resources import ResourceSample
+
+FORMAT_VERSION = 1
+CHUNK_SIZE = 65536
+RUN_COLUMNS = ("start_time", "finish_time", "run_time", "failed", "run_id")
+INTERVAL_COLUMNS = ("time",) + GeneralStats._fields
+RESOURCE_COLUMNS = ResourceSample._fields
+
+
+def _npy_bytes(array):
+    buf = io.BytesIO()
+    numpy.lib.format.write_array(buf, numpy.asanyarray(array))
+    return buf.getvalue()
+
+
+class ResultsWriter(object):
+
+    def __init__(self, path, duration, sample_interval):
+        self.path = path
+        self.duration = duration
+        self.sample_interval = sample_interval
+        self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED,
+                                    allowZip64=True)
+        self._chunks = {}
+
+    def _write(self, name, array):
+        self._zip.writestr(name + ".npy", _npy_bytes(array))
+
+    def write_runs(self, task_name, runs):
+        """Write `runs` (any iterable of `Run`) in CHUNK_SIZE chunks."""
+        n_chunks = self._chunks.get(task_name, 0)
+        chunk = []
+        for run in runs:
+            chunk.append(run)
+            if len(chunk) == CHUNK_SIZE:
+                self._write_runs_chunk(task_name, n_chunks, chunk)
+                n_chunks += 1
+                chunk = []
+        if chunk:
+            self._write_runs_chunk(task_name, n_chunks, chunk)
+            n_chunks += 1
+        self._chunks[task_name] = n_chunks
+
+    def _write_runs_chunk(self, task_name, n, runs):
+        for col, array in runs_arrays(runs).iteritems():
+            self._write("%s/runs/%s/%05d" % (task_name, col, n), array)
+
+    def write_intervals(self, task_name, intervals):
+        """Write `intervals`, a list of (time, GeneralStats) tuples."""
+        self._chunks.setdefault(task_name, 0)
+        columns = zip(*[(i,) + tuple(s) for i, s in intervals]) or \
+                  [()] * len(INTERVAL_COLUMNS)
+        for col, values in zip(INTERVAL_COLUMNS, columns):
+            self._write("%s/intervals/%s" % (task_name, col),
+                        numpy.array(values, dtype=numpy.float64))
+
+    def write_resources(self, task_name, samples):
+        """Write a list of `ResourceSample`."""
+        columns = zip(*samples) or [()] * len(RESOURCE_COLUMNS)
+        for col, values in zip(RESOURCE_COLUMNS, columns):
+            values = [numpy.nan if v is None else v for v in values]
+            self._write("%s/resources/%s" % (task_name, col),
+                        numpy.array(values, dtype=numpy.float64))
+
+    def close(self):
+        meta = {"version": FORMAT_VERSION,
+                "duration": self.duration,
+                "sample_interval": self.sample_interval,
+                "chunks": self._chunks}
+        self._zip.writestr("meta.json", json.dumps(meta))
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def load_results(path):
+    """
+    Load a results file written by `ResultsWriter`.
+
+    Returns (meta, data) where data maps each task name to a dict with
+    "runs", "intervals" and "resources" dicts of column name -> numpy array.
+    """
+    with zipfile.ZipFile(path) as zf:
+        meta = json.loads(zf.read("meta.json"))
+
+        names = set(zf.namelist())
+
+        def read(name):
+            return numpy.lib.format.read_array(io.BytesIO(zf.read(name + ".npy")))
+
+        data = {}
+        for task_name, n_chunks in meta["chunks"].iteritems():
+            runs = {}
+            for col in RUN_COLUMNS:
+                if n_chunks and "%s/runs/%s/00000.npy" % (task_name, col) not in names:
+                    # column added after this file was written
+                    continue
+                chunks = [read("%s/runs/%s/%05d" % (task_name, col, n))
+                          for n in xrange(n_chunks)]
+                runs[col] = numpy.concatenate(chunks) if chunks else numpy.empty(0)
+            intervals = dict((col, read("%s/intervals/%s" % (task_name, col)))
+                             for col in INTERVAL_COLUMNS)
+            resources = dict((col, read("%s/resources/%s" % (task_name, col)))
+                             for col in RESOURCE_COLUMNS
+                             if "%s/resources/%s.npy" % (task_name, col) in names)
+            data[task_name] = {"runs": runs, "intervals": intervals,
+                               "resources": resources}
+    return meta, data
@@ -5,6 +5,7 @@ import sys
 import gevent.monkey
 from buzz_search import buzz_client
 from .task import Task
+from .feeders import Feeder
 
 def random_query(size=3):
     return "".join([random.choice(string.letters) for i in xrange(size)])
@@ -14,10 +15,11 @@ class SphinxGevent(Task):
     executor = "gevent"
     max_threads = 5000
     multiple_instances = True
+    feeder = Feeder(random_query, size=100000, mode="random")
 
     def setup(self):
         gevent.monkey.patch_all()
         self.p = buzz_client.BuzzClient()
 
-    def run(self):
-        r = self.p.query(random_query())
+    def run(self, query):
+        r = self.p.query(query)
@@ -0,0 +1,293 @@
+"""
+SQLite catalog of exported results, to query many benchmarks at once
+without opening every export directory.
+
+Every export is recorded with a summary row per task (throughput and
+latency percentiles) and per-interval aggregates, including the achieved
+load of every interval, so latencies can be compared at a given load
+level. Indexes on (task, date) and (task, load) keep history queries fast
+with thousands of exports:
+
+    pumba history --task Search --metric p99 --since 30
+    pumba history --task Search --load 400:600
+    pumba history --add myresults*
+
+The catalog is at ~/.pumba/catalog.sqlite unless $PUMBA_CATALOG is set.
+"""
+from __future__ import division
+import os
+import sys
+import time
+import socket
+import sqlite3
+import logging
+import argparse
+
+import numpy
+import prettytable
+
+from .binary_results import load_results
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS exports (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    created REAL,
+    duration REAL,
+    sample_interval REAL,
+    host TEXT
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    export_id INTEGER REFERENCES exports(id) ON DELETE CASCADE,
+    task TEXT,
+    created REAL,
+    runs INTEGER,
+    failed INTEGER,
+    rps REAL,
+    avg REAL, p50 REAL, p90 REAL, p99 REAL, p999 REAL, max REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_task_created ON tasks (task, created);
+CREATE INDEX IF NOT EXISTS tasks_export ON tasks (export_id);
+CREATE TABLE IF NOT EXISTS intervals (
+    task_id INTEGER REFERENCES tasks(id) ON DELETE CASCADE,
+    task TEXT,
+    created REAL,
+    time REAL,
+    rps REAL,
+    failed INTEGER,
+    avg REAL, p50 REAL, p90 REAL, p99 REAL, p999 REAL, max REAL
+);
+CREATE INDEX IF NOT EXISTS intervals_task_rps ON intervals (task, rps);
+CREATE INDEX IF NOT EXISTS intervals_task_created ON intervals (task, created);
+CREATE INDEX IF NOT EXISTS intervals_task_id ON intervals (task_id);
+"""
+
+PERCENTILES = (50, 90, 99, 99.9)
+METRICS = ("rps", "avg", "p50", "p90", "p99", "p999", "max", "failed")
+# metrics stored in seconds, shown in ms
+_LATENCY_METRICS = ("avg", "p50", "p90", "p99", "p999", "max")
+
+
+class CatalogException(Exception):
+    pass
+
+
+def default_path():
+    return os.environ.get("PUMBA_CATALOG",
+                          os.path.join(os.path.expanduser("~"), ".pumba",
+                                       "catalog.sqlite"))
+
+
+def connect(path=None):
+    """Open (and create if needed) the catalog at `path`."""
+    if path is None:
+        path = default_path()
+    dir_path = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(dir_path):
+        os.makedirs(dir_path)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _latency_row(run_time):
+    """(avg, p50, p90, p99, p999, max) of the successful run times."""
+    if not len(run_time):
+        return (None,) * (len(PERCENTILES) + 2)
+    return ((float(run_time.mean()),) +
+            tuple(float(p) for p in numpy.percentile(run_time, PERCENTILES)) +
+            (float(run_time.max()),))
+
+
+def aggregate_runs(start_time, run_time, failed, duration, step):
+    """
+    Summary row (runs, failed, rps, latencies...) and interval rows
+    (time, rps, failed, latencies...) of raw run columns, bucketed every
+    `step` seconds by start time.
+    """
+    ok = ~numpy.isnan(run_time)
+    summary = ((len(start_time), int(failed.sum()),
+                ok.sum() / duration if duration else 0.0) +
+               _latency_row(run_time[ok]))
+
+    n = max(1, int(numpy.ceil(duration / step)))
+    idx = (start_time / step).astype(numpy.intp)
+    inside = idx < n
+    idx, run_time, failed, ok = idx[inside], run_time[inside], failed[inside], ok[inside]
+    # one sort to get every bucket's run times contiguous
+    order = numpy.argsort(idx, kind="mergesort")
+    bounds = numpy.searchsorted(idx[order], numpy.arange(n+1))
+    intervals = []
+    for i in xrange(n):
+        sel = order[bounds[i]:bounds[i+1]]
+        times = run_time[sel][ok[sel]]
+        intervals.append((i*step, len(times) / step, int(failed[sel].sum())) +
+                         _latency_row(times))
+    return summary, intervals
+
+
+def record_export(conn, path, created, duration, sample_interval, tasks,
+                  host=None):
+    """
+    Record the export at `path`. `tasks` maps task names to raw run
+    columns (start_time, run_time, failed). An export already recorded
+    with the same path is replaced.
+    """
+    path = os.path.abspath(path)
+    with conn:
+        conn.execute("DELETE FROM exports WHERE path = ?", (path,))
+        export_id = conn.execute(
+            "INSERT INTO exports (path, created, duration, sample_interval, host) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (path, created, duration, sample_interval,
+             host or socket.gethostname())).lastrowid
+        for task_name, runs in sorted(tasks.iteritems()):
+            summary, intervals = aggregate_runs(runs["start_time"],
+                                                runs["run_time"],
+                                                runs["failed"],
+                                                duration, sample_interval)
+            task_id = conn.execute(
+                "INSERT INTO tasks (export_id, task, created, runs, failed, rps, "
+                "avg, p50, p90, p99, p999, max) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (export_id, task_name, created) + summary).lastrowid
+            conn.executemany(
+                "INSERT INTO intervals (task_id, task, created, time, rps, failed, "
+                "avg, p50, p90, p99, p999, max) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(task_id, task_name, created) + i for i in intervals])
+    return export_id
+
+
+def record_benchmark(benchmark, dir_path, sample_interval, path=None):
+    """Record the export of a finished `Benchmark` to `dir_path`."""
+    tasks = dict((b.task.__name__, b._executor.stats.runs_arrays())
+                 for b in benchmark._benchmarks if b._executor is not None)
+    conn = connect(path)
+    try:
+        return record_export(conn, dir_path, time.time(), benchmark.duration,
+                             sample_interval, tasks)
+    finally:
+        conn.close()
+
+
+def index_export_dir(conn, dir_path):
+    """Record an existing export directory from its results.npz."""
+    npz = os.path.join(dir_path, "results.npz")
+    if not os.path.exists(npz):
+        raise CatalogException("No results.npz in `%s`" % dir_path)
+    meta, data = load_results(npz)
+    tasks = dict((task_name, d["runs"]) for task_name, d in data.iteritems())
+    return record_export(conn, dir_path, os.path.getmtime(npz), meta["duration"],
+                         meta["sample_interval"], tasks)
+
+
+def history(conn, task=None, metric="p99", since=None, load=None):
+    """
+    (created, path, task, value) of every recorded export, oldest first.
+    `since` is an epoch. With `load`, a (min, max) RPS range, the value is
+    the average of the metric over the intervals within that load.
+    """
+    if metric not in METRICS:
+        raise CatalogException("Unknown metric `%s`" % metric)
+    where = []
+    params = []
+    if task is not None:
+        # on intervals with a load, to use the (task, rps) index
+        where.append("t.task = ?" if load is None else "i.task = ?")
+        params.append(task)
+    if since is not None:
+        where.append("t.created >= ?")
+        params.append(since)
+    if load is None:
+        query = ("SELECT t.created, e.path, t.task, t.%s FROM tasks t "
+                 "JOIN exports e ON e.id = t.export_id" % metric)
+    else:
+        where.append("i.rps BETWEEN ? AND ?")
+        params.extend(load)
+        query = ("SELECT t.created, e.path, t.task, AVG(i.%s) FROM intervals i "
+                 "JOIN tasks t ON t.id = i.task_id "
+                 "JOIN exports e ON e.id = t.export_id" % metric)
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    if load is not None:
+        query += " GROUP BY t.id"
+    query += " ORDER BY t.created"
+    return conn.execute(query, params).fetchall()
+
+
+def trend(rows):
+    """
+    (change per day, relative change from the first to the last value) of
+    history rows, None when there aren't 2 values.
+    """
+    points = [(r[0], r[3]) for r in rows if r[3] is not None]
+    if len(points) < 2:
+        return None
+    t, v = numpy.array(points).T
+    slope = numpy.polyfit((t - t[0]) / 86400.0, v, 1)[0] if t[-1] > t[0] else 0.0
+    return slope, (v[-1] - v[0]) / v[0] if v[0] else None
+
+
+def format_history(rows, metric):
+    scale, unit = (1000, " (ms)") if metric in _LATENCY_METRICS else (1, "")
+    t = prettytable.PrettyTable(["date", "task", metric + unit, "export"],
+                                padding_width=2, border=False)
+    t.align = "r"
+    t.align["export"] = "l"
+    t.float_format = "0.3"
+    for created, path, task, value in rows:
+        t.add_row([time.strftime("%Y-%m-%d %H:%M", time.localtime(created)),
+                   task, value * scale if value is not None else "-", path])
+    l = [t.get_string()]
+    for task in sorted(set(r[2] for r in rows)):
+        tr = trend([r for r in rows if r[2] == task])
+        if tr is not None:
+            slope, change = tr
+            l.append("%s: %+.3f%s per day%s" % (
+                task, slope * scale, " ms" if unit else "",
+                ", %+.1f%% first to last" % (change*100) if change is not None
+                else ""))
+    return "\n".join(l)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="pumba history")
+    parser.add_argument("--catalog", default=None,
+                        help="catalog path (default: $PUMBA_CATALOG or %s)"
+                             % default_path())
+    parser.add_argument("-t", "--task", default=None)
+    parser.add_argument("-m", "--metric", default="p99", choices=METRICS)
+    parser.add_argument("--since", type=float, default=None, metavar="DAYS",
+                        help="only the last DAYS days")
+    parser.add_argument("--load", default=None, metavar="MIN:MAX",
+                        help="only intervals with an RPS in this range")
+    parser.add_argument("--add", nargs="+", default=None, metavar="DIR",
+                        help="record existing export directories")
+    args = parser.parse_args(argv)
+
+    conn = connect(args.catalog)
+    try:
+        if args.add:
+            for dir_path in args.add:
+                try:
+                    index_export_dir(conn, dir_path)
+                except CatalogException as e:
+                    print >>sys.stderr, e
+            return 0
+
+        since = None
+        if args.since is not None:
+            since = time.time() - args.since * 86400
+        load = None
+        if args.load is not None:
+            load = tuple(float(x) for x in args.load.split(":"))
+        rows = history(conn, args.task, args.metric, since, load)
+        print format_history(rows, args.metric)
+    finally:
+        conn.close()
+    return 0
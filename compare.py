@@ -0,0 +1,362 @@
+from __future__ import division
+import os
+import json
+import math
+import argparse
+import logging
+import numpy
+import prettytable
+
+from .binary_results import load_results
+
+log = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 99)
+# max number of floats materialized at once by the bootstrap
+BOOTSTRAP_BLOCK = 10**7
+
+
+class CompareException(Exception):
+    pass
+
+
+def load_result_set(path):
+    """
+    Load an exported result set for comparison. `path` can be an export
+    directory, a `results.npz` or a `results.js` file.
+
+    Returns a dict task_name -> {"raw": bool, ...}. Raw result sets have
+    "start_time"/"run_time"/"failed" arrays, aggregated ones (results.js)
+    only have per-interval "runs" and "avg_run_time" series.
+    """
+    if os.path.isdir(path):
+        for name in ("results.npz", "results.js"):
+            if os.path.exists(os.path.join(path, name)):
+                path = os.path.join(path, name)
+                break
+        else:
+            raise CompareException("No results found in `%s`" % path)
+
+    sets = {}
+    if path.endswith(".npz"):
+        meta, data = load_results(path)
+        for task_name, d in data.iteritems():
+            runs = d["runs"]
+            sets[task_name] = {"raw": True,
+                               "duration": meta["duration"],
+                               "start_time": runs["start_time"],
+                               "run_time": runs["run_time"],
+                               "failed": runs["failed"],
+                               # not in older results files
+                               "run_id": runs.get("run_id")}
+    elif path.endswith(".js"):
+        with open(path) as f:
+            content = f.read().strip()
+        content = content[content.index("=")+1:].rstrip(";")
+        for task_name, d in json.loads(content).iteritems():
+            runs = numpy.array(d["runs"], dtype=numpy.float64).reshape(-1, 2)
+            avg = numpy.array(d["avg_run_time"], dtype=numpy.float64).reshape(-1, 2)
+            sets[task_name] = {"raw": False,
+                               "duration": runs[-1, 0] if len(runs) else 0.0,
+                               "runs": runs,
+                               # results.js latencies are in ms
+                               "avg_run_time": avg * (1.0, 1/1000)}
+    else:
+        raise CompareException("Unknown results format `%s`" % path)
+    return sets
+
+
+def rankdata(x):
+    """Ranks of `x` with ties averaged (same as scipy.stats.rankdata)."""
+    sorter = numpy.argsort(x, kind="mergesort")
+    inv = numpy.empty(sorter.size, dtype=numpy.intp)
+    inv[sorter] = numpy.arange(sorter.size, dtype=numpy.intp)
+    x = x[sorter]
+    obs = numpy.r_[True, x[1:] != x[:-1]]
+    dense = obs.cumsum()[inv]
+    count = numpy.r_[numpy.nonzero(obs)[0], len(obs)]
+    return .5 * (count[dense] + count[dense-1] + 1)
+
+
+def mann_whitney(a, b):
+    """
+    Two-sided Mann-Whitney U test with tie correction (normal approximation).
+
+    Returns (U, p_value, prob) where `prob` is the probability that a random
+    value of `b` is greater than a random value of `a`.
+    """
+    n1, n2 = len(a), len(b)
+    if n1 == 0 or n2 == 0:
+        return numpy.nan, numpy.nan, numpy.nan
+    x = numpy.concatenate((a, b))
+    ranks = rankdata(x)
+    u1 = ranks[:n1].sum() - n1*(n1+1)/2
+    n = n1 + n2
+    _, counts = numpy.unique(x, return_counts=True)
+    ties = (counts**3 - counts).sum()
+    sigma = math.sqrt(n1*n2/12 * ((n+1) - ties/(n*(n-1)))) if n > 1 else 0.0
+    if sigma == 0:
+        return u1, 1.0, 0.5
+    z = (u1 - n1*n2/2) / sigma
+    p = math.erfc(abs(z) / math.sqrt(2))
+    return u1, p, 1 - u1/(n1*n2)
+
+
+def bootstrap_percentile_delta(a, b, percentiles=PERCENTILES, n_boot=200,
+                               confidence=0.95, seed=None):
+    """
+    Bootstrap confidence intervals of percentile(b) - percentile(a).
+
+    Returns an array of shape (len(percentiles), 3) with the point estimate
+    and the lower/upper bounds for each percentile.
+    """
+    percentiles = list(percentiles)
+    out = numpy.empty((len(percentiles), 3))
+    if len(a) == 0 or len(b) == 0:
+        out.fill(numpy.nan)
+        return out
+    rnd = numpy.random.RandomState(seed)
+    out[:, 0] = numpy.percentile(b, percentiles) - numpy.percentile(a, percentiles)
+    rows = max(1, BOOTSTRAP_BLOCK // max(len(a), len(b)))
+    deltas = []
+    done = 0
+    while done < n_boot:
+        k = min(rows, n_boot - done)
+        pa = numpy.percentile(a[rnd.randint(0, len(a), (k, len(a)))],
+                              percentiles, axis=1)
+        pb = numpy.percentile(b[rnd.randint(0, len(b), (k, len(b)))],
+                              percentiles, axis=1)
+        deltas.append(pb - pa)
+        done += k
+    deltas = numpy.concatenate(deltas, axis=1)
+    alpha = (1 - confidence) / 2 * 100
+    out[:, 1], out[:, 2] = numpy.percentile(deltas, (alpha, 100-alpha), axis=1)
+    return out
+
+
+def _bucketize(start_time, bucket, n_buckets):
+    idx = (start_time // bucket).astype(numpy.intp)
+    return numpy.clip(idx, 0, n_buckets-1)
+
+
+def compare_raw(a, b, bucket, percentiles=PERCENTILES, n_boot=200):
+    """
+    Compare two raw result sets, aligned by time since the benchmark start
+    (i.e. by load level, for the same load profile).
+
+    Returns (overall, rows) where rows has one entry per time bucket.
+    """
+    duration = min(a["duration"], b["duration"])
+    n_buckets = max(1, int(math.ceil(duration / bucket)))
+
+    def prepare(s):
+        inside = s["start_time"] < n_buckets*bucket
+        ok = inside & ~s["failed"] & ~numpy.isnan(s["run_time"])
+        idx = _bucketize(s["start_time"][inside], bucket, n_buckets)
+        counts = numpy.bincount(idx, minlength=n_buckets)
+        failed = numpy.bincount(idx, weights=s["failed"][inside],
+                                minlength=n_buckets)
+        ok_idx = _bucketize(s["start_time"][ok], bucket, n_buckets)
+        order = numpy.argsort(ok_idx, kind="mergesort")
+        run_time = s["run_time"][ok][order]
+        bounds = numpy.searchsorted(ok_idx[order], numpy.arange(n_buckets+1))
+        return counts, failed, run_time, bounds
+
+    ca, fa, rta, ba = prepare(a)
+    cb, fb, rtb, bb = prepare(b)
+
+    # throughput: counts are treated as poisson, so var(rate) = count/bucket**2
+    rate_delta = (cb - ca) / bucket
+    rate_err = 1.96 * numpy.sqrt(ca + cb) / bucket
+
+    rows = []
+    for i in xrange(n_buckets):
+        xa = rta[ba[i]:ba[i+1]]
+        xb = rtb[bb[i]:bb[i+1]]
+        rows.append({"time": i*bucket,
+                     "rate_a": ca[i]/bucket,
+                     "rate_b": cb[i]/bucket,
+                     "rate_delta": (rate_delta[i], rate_delta[i]-rate_err[i],
+                                    rate_delta[i]+rate_err[i]),
+                     "failed_a": int(fa[i]),
+                     "failed_b": int(fb[i]),
+                     "percentiles": bootstrap_percentile_delta(xa, xb,
+                                                               percentiles,
+                                                               n_boot)})
+    u, p, prob = mann_whitney(rta, rtb)
+    overall = {"rate_a": ca.sum()/(n_buckets*bucket),
+               "rate_b": cb.sum()/(n_buckets*bucket),
+               "rate_delta": rate_delta.mean(),
+               "percentiles": bootstrap_percentile_delta(rta, rtb, percentiles,
+                                                         n_boot),
+               "mann_whitney_u": u,
+               "p_value": p,
+               "prob_b_slower": prob}
+    return overall, rows
+
+
+def compare_paired(a, b, percentiles=PERCENTILES):
+    """
+    Compare two raw result sets run by run, matching runs by id. Only makes
+    sense for benchmarks of the same recorded schedule, where run ids are
+    schedule indexes (same arrival time and seed).
+
+    Returns a dict with the number of pairs (runs successful in both), the
+    runs failed in only one of the sets, the percentiles of the per-run
+    deltas (B - A) and a two-sided sign test of B being slower.
+    """
+    if a["run_id"] is None or b["run_id"] is None:
+        raise CompareException("Paired comparisons need results with run ids")
+    ia, ib = _matching_indexes(a["run_id"], b["run_id"])
+    ok_a = ~a["failed"][ia] & ~numpy.isnan(a["run_time"][ia])
+    ok_b = ~b["failed"][ib] & ~numpy.isnan(b["run_time"][ib])
+    both = ok_a & ok_b
+    delta = b["run_time"][ib][both] - a["run_time"][ia][both]
+    n = len(delta)
+    slower = int((delta > 0).sum())
+    ties = int((delta == 0).sum())
+    m = n - ties
+    if m:
+        z = (slower - m/2) / math.sqrt(m/4)
+        p = math.erfc(abs(z) / math.sqrt(2))
+    else:
+        p = numpy.nan
+    return {"pairs": n,
+            "failed_a_only": int((a["failed"][ia] & ~b["failed"][ib]).sum()),
+            "failed_b_only": int((b["failed"][ib] & ~a["failed"][ia]).sum()),
+            "avg_delta": delta.mean() if n else numpy.nan,
+            "percentiles": (numpy.percentile(delta, percentiles) if n
+                            else [numpy.nan] * len(percentiles)),
+            "b_slower": slower / m if m else numpy.nan,
+            "sign_p_value": p}
+
+
+def _matching_indexes(x, y):
+    """Indexes in `x` and in `y` of the (unique) ids in both."""
+    ids = numpy.intersect1d(x, y)
+    ix = numpy.argsort(x, kind="mergesort")
+    iy = numpy.argsort(y, kind="mergesort")
+    return (ix[numpy.searchsorted(x[ix], ids)],
+            iy[numpy.searchsorted(y[iy], ids)])
+
+
+def format_paired(task_name, paired, percentiles=PERCENTILES):
+    l = ["Run by run comparison of %s (B - A, %d paired runs)"
+         % (task_name, paired["pairs"]),
+         "Avg delta: %+.3f ms" % (paired["avg_delta"]*1000),
+         "Delta percentiles: " + ", ".join(
+             "p%g %+.3f ms" % (p, d*1000)
+             for p, d in zip(percentiles, paired["percentiles"])),
+         "Failed only in A: %d, only in B: %d" % (paired["failed_a_only"],
+                                                  paired["failed_b_only"]),
+         "B slower in %.1f%% of the runs, sign test p=%.4g"
+         % (paired["b_slower"]*100, paired["sign_p_value"])]
+    return "\n".join(l)
+
+
+def compare_aggregated(a, b, bucket):
+    """
+    Compare result sets for which only aggregated series are available.
+    Only point deltas can be computed, without confidence intervals.
+    """
+    duration = min(a["duration"], b["duration"])
+    grid = numpy.arange(0.0, duration, bucket)
+
+    def at(series, x):
+        if len(series) == 0:
+            return numpy.zeros(len(x))
+        return numpy.interp(x, series[:, 0], series[:, 1])
+
+    rate_a, rate_b = at(a["runs"], grid), at(b["runs"], grid)
+    avg_a, avg_b = at(a["avg_run_time"], grid), at(b["avg_run_time"], grid)
+    rows = [{"time": t,
+             "rate_a": ra, "rate_b": rb,
+             "rate_delta": (rb-ra, numpy.nan, numpy.nan),
+             "avg_delta": ab-aa}
+            for t, ra, rb, aa, ab in zip(grid, rate_a, rate_b, avg_a, avg_b)]
+    overall = {"rate_a": rate_a.mean() if len(grid) else 0.0,
+               "rate_b": rate_b.mean() if len(grid) else 0.0,
+               "rate_delta": (rate_b - rate_a).mean() if len(grid) else 0.0,
+               "avg_delta": (avg_b - avg_a).mean() if len(grid) else 0.0}
+    return overall, rows
+
+
+def _ci(values, scale=1.0, fmt="%+.3f"):
+    v, lo, hi = values
+    if numpy.isnan(lo):
+        return fmt % (v*scale)
+    return (fmt + " [" + fmt + ", " + fmt + "]") % (v*scale, lo*scale, hi*scale)
+
+
+def format_comparison(task_name, raw, overall, rows, percentiles=PERCENTILES):
+    cols = ["time", "RPS A", "RPS B", "RPS delta"]
+    if raw:
+        cols += ["p%g delta (ms)" % p for p in percentiles]
+    else:
+        cols += ["Avg delta (ms)"]
+    t = prettytable.PrettyTable(cols, padding_width=2, border=False)
+    t.align = "r"
+    t.float_format = "0.2"
+    for r in rows + [dict(overall, time="Total")]:
+        values = [r["time"], r["rate_a"], r["rate_b"],
+                  _ci(r["rate_delta"]) if type(r["rate_delta"]) is tuple
+                  else "%+.3f" % r["rate_delta"]]
+        if raw:
+            values += [_ci(p, 1000) for p in r["percentiles"]]
+        else:
+            values += ["%+.3f" % (r["avg_delta"]*1000)]
+        t.add_row(values)
+
+    l = ["Comparison of %s (B - A, 95%% confidence intervals)\n" % task_name,
+         t.get_string()]
+    if raw:
+        l.append("\nMann-Whitney U=%.1f p=%.4g, P(B slower than A)=%.3f" %
+                 (overall["mann_whitney_u"], overall["p_value"],
+                  overall["prob_b_slower"]))
+    return "\n".join(l)
+
+
+def compare(path_a, path_b, bucket=None, percentiles=PERCENTILES, n_boot=200,
+            paired=False):
+    sets_a = load_result_set(path_a)
+    sets_b = load_result_set(path_b)
+    output = []
+    for task_name in sorted(set(sets_a) & set(sets_b)):
+        a, b = sets_a[task_name], sets_b[task_name]
+        task_bucket = bucket
+        if task_bucket is None:
+            task_bucket = max(min(a["duration"], b["duration"]) / 10.0, 1e-3)
+        if a["raw"] and b["raw"]:
+            overall, rows = compare_raw(a, b, task_bucket, percentiles, n_boot)
+        else:
+            overall, rows = compare_aggregated(a, b, task_bucket)
+        output.append(format_comparison(task_name, a["raw"] and b["raw"],
+                                        overall, rows, percentiles))
+        if paired:
+            if not (a["raw"] and b["raw"]):
+                raise CompareException("Paired comparisons need raw results "
+                                       "(results.npz)")
+            output.append(format_paired(task_name, compare_paired(a, b, percentiles),
+                                        percentiles))
+    if not output:
+        raise CompareException("No tasks in common between `%s` and `%s`" %
+                               (path_a, path_b))
+    return "\n\n".join(output)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="pumba compare")
+    parser.add_argument("results_a", help="baseline result set")
+    parser.add_argument("results_b", help="result set to compare")
+    parser.add_argument("-b", "--bucket", type=float, default=None,
+                        help="seconds per aligned time bucket")
+    parser.add_argument("-p", "--percentiles", type=float, nargs="+",
+                        default=PERCENTILES)
+    parser.add_argument("--bootstrap", type=int, default=200,
+                        help="number of bootstrap resamples")
+    parser.add_argument("--paired", action="store_true",
+                        help="also compare run by run, for benchmarks of the "
+                             "same recorded schedule")
+    args = parser.parse_args(argv)
+    print compare(args.results_a, args.results_b, args.bucket,
+                  args.percentiles, args.bootstrap, args.paired)
@@ -0,0 +1,70 @@
+"""
+CPU affinity helpers. Uses os.sched_{get,set}affinity where available and
+the libc calls through ctypes otherwise (python 2 on linux); elsewhere
+affinity is not supported and every CPU is assumed available.
+"""
+import os
+import ctypes
+import ctypes.util
+import logging
+import multiprocessing
+
+log = logging.getLogger(__name__)
+
+_MAX_CPUS = 1024
+_WORD_BITS = ctypes.sizeof(ctypes.c_ulong) * 8
+_CpuSet = ctypes.c_ulong * (_MAX_CPUS // _WORD_BITS)
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    _libc.sched_getaffinity
+    _libc.sched_setaffinity
+except (OSError, AttributeError, TypeError):
+    _libc = None
+
+
+def available_cpus():
+    """CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    if _libc is not None:
+        mask = _CpuSet()
+        if _libc.sched_getaffinity(0, ctypes.sizeof(mask), ctypes.byref(mask)) == 0:
+            return [i for i in xrange(_MAX_CPUS)
+                    if mask[i // _WORD_BITS] >> (i % _WORD_BITS) & 1]
+    return range(multiprocessing.cpu_count())
+
+
+def set_affinity(cpus):
+    """Pin this process to `cpus`. Returns False if it isn't supported."""
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+        return True
+    if _libc is None:
+        return False
+    mask = _CpuSet()
+    for i in cpus:
+        mask[i // _WORD_BITS] |= 1 << (i % _WORD_BITS)
+    if _libc.sched_setaffinity(0, ctypes.sizeof(mask), ctypes.byref(mask)) != 0:
+        errno = ctypes.get_errno()
+        log.warning("Couldn't set the CPU affinity to %s: %s"
+                    % (cpus, os.strerror(errno)))
+        return False
+    return True
+
+
+def split_cpus(cpus, n):
+    """
+    Split `cpus` in `n` disjoint sets as even as possible. With fewer CPUs
+    than sets, sets get one CPU each, round-robin.
+    """
+    if len(cpus) < n:
+        return [[cpus[i % len(cpus)]] for i in xrange(n)]
+    size, extra = divmod(len(cpus), n)
+    sets = []
+    i = 0
+    for k in xrange(n):
+        j = i + size + (k < extra)
+        sets.append(list(cpus[i:j]))
+        i = j
+    return sets
@@ -0,0 +1,128 @@
+"""
+Multi-resolution interval aggregates for the HTML report.
+
+Raw runs are bucketed once at the finest resolution; every coarser zoom level
+is then obtained by merging `LEVEL_FACTOR` consecutive buckets, which keeps
+counts, sums and min/max exact (so latency spikes survive downsampling).
+Variances are kept as sums of squared deviations from the bucket mean and
+merged with Chan's formula, like `stats.RunStats`.
+"""
+from __future__ import division
+import math
+import numpy
+
+from .stats import in_flight
+
+LEVEL_FACTOR = 4
+MAX_POINTS = 2000
+
+_SUM_FIELDS = ("submited", "finished", "failed", "ok", "sum",
+               "completed", "in_flight_area")
+
+
+def aggregate(start_time, finish_time, run_time, failed, step, duration,
+              **columns):
+    """
+    Bucket runs by start time in `step` seconds buckets, in one pass. Also
+    counts completions by finish time and the runs in flight.
+
+    Takes the columns returned by `stats.runs_arrays`, ignoring the others.
+    """
+    n = max(1, int(math.ceil(duration / step)))
+    done = finish_time[~numpy.isnan(finish_time)]
+    done_idx = (done[done < n*step] / step).astype(numpy.intp)
+    in_flight_avg, in_flight_max = in_flight(start_time, finish_time, step, n)
+
+    inside = start_time < n*step
+    idx = (start_time[inside] / step).astype(numpy.intp)
+    run_time = run_time[inside]
+    failed = failed[inside]
+    finished = failed | ~numpy.isnan(run_time)
+    ok = finished & ~failed
+    ok_idx = idx[ok]
+    ok_time = run_time[ok]
+
+    ok_count = numpy.bincount(ok_idx, minlength=n)
+    ok_sum = numpy.bincount(ok_idx, weights=ok_time, minlength=n)
+    mean = ok_sum / numpy.maximum(ok_count, 1)
+    m2 = numpy.bincount(ok_idx, weights=(ok_time - mean[ok_idx])**2, minlength=n)
+
+    min_time = numpy.full(n, numpy.inf)
+    numpy.minimum.at(min_time, ok_idx, ok_time)
+    max_time = numpy.zeros(n)
+    numpy.maximum.at(max_time, ok_idx, ok_time)
+    return {"step": step,
+            "submited": numpy.bincount(idx, minlength=n),
+            "finished": numpy.bincount(idx[finished], minlength=n),
+            "failed": numpy.bincount(idx[failed], minlength=n),
+            "ok": ok_count,
+            "sum": ok_sum,
+            "m2": m2,
+            "min": min_time,
+            "max": max_time,
+            "completed": numpy.bincount(done_idx, minlength=n),
+            "in_flight_area": in_flight_avg * step,
+            "in_flight_max": in_flight_max}
+
+
+def merge(agg, factor=LEVEL_FACTOR):
+    """Merge every `factor` consecutive buckets of `agg`."""
+    n = len(agg["submited"])
+    pad = -n % factor
+
+    def fold(a, fill):
+        return numpy.concatenate((a, numpy.full(pad, fill, a.dtype))).reshape(-1, factor)
+
+    merged = dict((f, fold(agg[f], 0).sum(axis=1)) for f in _SUM_FIELDS)
+    # Chan: m2 = sum(m2_i) + sum(n_i * (mean_i - mean)**2)
+    ok = fold(agg["ok"], 0)
+    means = fold(agg["sum"], 0) / numpy.maximum(ok, 1)
+    mean = merged["sum"] / numpy.maximum(merged["ok"], 1)
+    merged["m2"] = (fold(agg["m2"], 0).sum(axis=1) +
+                    (ok * (means - mean[:, None])**2).sum(axis=1))
+    merged["min"] = fold(agg["min"], numpy.inf).min(axis=1)
+    merged["max"] = fold(agg["max"], 0).max(axis=1)
+    merged["in_flight_max"] = fold(agg["in_flight_max"], 0).max(axis=1)
+    merged["step"] = agg["step"] * factor
+    return merged
+
+
+def levels(agg, max_points=MAX_POINTS, factor=LEVEL_FACTOR):
+    """
+    Zoom levels from the finest aggregate `agg`, finest first, until one
+    has at most `max_points` buckets.
+    """
+    l = [agg]
+    while len(l[-1]["submited"]) > max_points:
+        l.append(merge(l[-1], factor))
+    return l
+
+
+def series(agg, digits=1):
+    """
+    Chart series ([time, value] pairs) of one aggregate level, with run
+    times in milliseconds rounded to `digits` decimals.
+    """
+    step = agg["step"]
+    t = numpy.round(numpy.arange(len(agg["submited"])) * step, 4)
+    ok = agg["ok"]
+    has_ok = ok > 0
+    safe_ok = numpy.maximum(ok, 1)
+    avg = agg["sum"] / safe_ok
+    var = agg["m2"] / numpy.maximum(ok-1, 1)
+    std_dev = numpy.sqrt(numpy.clip(var, 0, None))
+    std_dev[ok <= 1] = 0.0
+
+    def pairs(values, mask=None):
+        if mask is not None:
+            return zip(t[mask].tolist(), values[mask].tolist())
+        return zip(t.tolist(), values.tolist())
+
+    ms = lambda a: numpy.round(a*1000, digits)
+    return {"avg_run_time": pairs(ms(avg)),
+            "std_dev": pairs(ms(std_dev)),
+            "max_run_time": pairs(ms(agg["max"]), has_ok),
+            "failed": pairs(agg["failed"] / step),
+            "runs": pairs(agg["submited"] / step),
+            "completed": pairs(agg["completed"] / step),
+            "in_flight": pairs(numpy.round(agg["in_flight_area"] / step, 2))}
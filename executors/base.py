@@ -1,37 +1,62 @@
 import logging
 import time
 import sys
+import threading
+import itertools
 from collections import OrderedDict
 
-from ..stats import Stats
-from ..sorted_collection import SortedCollection
+from ..stats import Stats, RunStats
+from ..time_index import TimeIndex
+from .. import tracing
+from .. import schedule
+from . import shm_ring
 
 log = logging.getLogger(__name__)
 
-def run_task_func_wrapper(f, run_id):
+
+class RunTimeout(Exception):
+    pass
+
+
+def run_task_func_wrapper(f, run_id, trace_ctx=None, args=(), seed=None):
     result = RunResult(run_id)
+    if trace_ctx is not None:
+        tracing.bind(trace_ctx)
+        result.trace = trace_ctx
+    if seed is not None:
+        schedule.bind_seed(seed)
     try:
         start_time = time.time()
-        f()
+        if trace_ctx is not None:
+            trace_ctx.start = start_time
+        f(*args)
         run_time = time.time() - start_time
         result.run_time = run_time
     except Exception:
         #log.debug("Run crashed", exc_info=True)
         result.exc = sys.exc_info()[:2]
+        result.timed_out = result.exc[0] is RunTimeout
+    finally:
+        if trace_ctx is not None:
+            tracing.unbind()
+        if seed is not None:
+            schedule.unbind_seed()
 
     return result
 
 
 class Run(object):
-    def __init__(self, run_id, start_time):
+    def __init__(self, run_id, start_time, intended_time=None, step=None):
         self.id = run_id
         self.finished = False
         self.result = None
         self.start_time = start_time
+        self.intended_time = intended_time
+        # name of the session step, for session tasks
+        self.step = step
+        # running time of the executor when the run finished (or timed out)
+        self.finish_time = None
 
-    @property
-    def finish_time(self):
-        return self.start_time + self.result.run_time if self.finished else None
 
     @property
     def run_time(self):
@@ -46,6 +71,8 @@ class RunResult(object):
         self.run_id = run_id
         self.exc = None
         self.run_time = None
+        self.trace = None
+        self.timed_out = False
 
 
 class AbstractExecutor(object):
@@ -53,11 +80,30 @@ class AbstractExecutor(object):
         self.task_cls = task_cls
         self._start_time = None
         self._end_time = None
-        self._all_runs = SortedCollection(key=lambda x: x.start_time)
+        self._all_runs = TimeIndex()
         self._running_runs = OrderedDict()
         self._finished_runs = OrderedDict()
         self._n_runs = 0
+        self._lock = threading.Lock()
+        self._timeout = getattr(task_cls, "timeout", None)
+        self._trace = getattr(task_cls, "trace", False)
+        self._trace_prefix = tracing.new_prefix()
+        self._instance_ids = {}
+        self._feeder = getattr(task_cls, "feeder", None)
+        # (worker, worker run id) -> run id, of runs ingested from records
+        self._remote_runs = {}
+        self.slow_runs = tracing.SlowRuns(getattr(task_cls, "slow_runs", 5))
         self.stats = Stats(self)
+        # stats of all the runs, updated as they start and finish; only
+        # the moments, to keep the work under the lock minimal
+        self.totals = RunStats(histogram=False)
+        # shm_ring.RunRing every run is also written to, when the runs are
+        # stored by another process
+        self.ring = None
+        self._step_ids = dict((step, i) for i, step in
+                              enumerate(getattr(task_cls, "steps", ())))
+        # schedule.Schedule the runs are dispatched from, for their seeds
+        self.schedule = None
 
     @property
     def running_time(self):
@@ -84,38 +130,158 @@ class AbstractExecutor(object):
     def available(self):
         raise NotImplementedError()
 
-    def wait_available(self):
+    def wait_available(self, timeout=None):
+        """Block until a run can be started. Returns False on timeout."""
         raise NotImplementedError()
 
-    def _run_task(self, run_id):
+    def _run_task(self, run_id, args=()):
         raise NotImplementedError()
 
-    def async_run_task(self):
+    def async_run_task(self, intended_time=None, args=()):
+        """
+        `intended_time` is the epoch at which the dispatcher meant to start
+        this run (defaults to now). `args` are passed to `Task.run`, followed
+        by the next item of the task feeder, if any.
+        """
+        if self._feeder is not None:
+            args = args + (self._feeder.next(),)
+        run = self._new_run(intended_time)
+        self._run_task(run.id, args)
+        return run
+
+    def _new_run(self, intended_time=None, step=None, start_time=None):
         run_id = self._n_runs
         self._n_runs += 1
-        run = Run(run_id, self.running_time)
-        self._running_runs[run_id] = run
-        self._all_runs.append(run)
-        self._run_task(run_id)
+        if intended_time is not None:
+            intended_time -= self._start_time
+        if start_time is None:
+            start_time = self.running_time
+        else:
+            start_time -= self._start_time
+        run = Run(run_id, start_time, intended_time, step)
+        with self._lock:
+            self._running_runs[run_id] = run
+            self.totals.submited += 1
+            if self.ring is not None:
+                self.ring.write_start(
+                    run_id, self._start_time + start_time,
+                    None if intended_time is None else self._start_time + intended_time,
+                    self._step_ids.get(step, -1))
+        self._all_runs.append(run.start_time, run)
         return run
 
-    def on_async_run_finished(self, result):
-        run = self._running_runs.get(result.run_id)
-        run.result = result
+    def on_async_run_finished(self, result, finish_time=None):
+        """
+        Store the result of a run, finished at the `finish_time` epoch
+        (defaults to now). Returns False if the run had already finished,
+        i.e. it had timed out.
+        """
+        with self._lock:
+            run = self._running_runs.pop(result.run_id, None)
+            if run is None:
+                return False
+            self._finished_runs[result.run_id] = run
+            run.result = result
+            if finish_time is None:
+                run.finish_time = self.running_time
+            else:
+                run.finish_time = finish_time - self._start_time
+            if result.exc is None:
+                self.totals.add(result.run_time)
+            else:
+                self.totals.add_failed(result.timed_out)
+            if self.ring is not None:
+                self.ring.write_finish(result.run_id,
+                                       self._start_time + run.finish_time, result)
         run.finished = True
-        del self._running_runs[result.run_id]
-        self._finished_runs[result.run_id] = run
+        if result.exc is None:
+            self.slow_runs.add(run)
+        return True
+
+    def expire_runs(self):
+        """
+        Finish the runs running for longer than the task `timeout` with a
+        timeout result. Returns the ids of the expired runs.
+        """
+        expired = []
+        now = self.running_time
+        with self._lock:
+            runs = list(self._running_runs.itervalues())
+        # runs are kept by start time, the oldest come first
+        for run in runs:
+            if run.start_time + self._timeout > now:
+                break
+            result = RunResult(run.id)
+            result.exc = (RunTimeout, RunTimeout("Run timed out after %ss" %
+                                                 self._timeout))
+            result.timed_out = True
+            if self.on_async_run_finished(result):
+                expired.append(run.id)
+        return expired
+
+    def trace_context(self, run_id, task=None):
+        """A new `TraceContext` for `run_id` if the task is traced, else None."""
+        if not self._trace:
+            return None
+        instance_id = self._instance_ids.get(id(task), 0)
+        run = self._running_runs.get(run_id) or self._finished_runs[run_id]
+        intended_time = run.start_time if run.intended_time is None \
+                        else run.intended_time
+        return tracing.TraceContext(self._trace_prefix, run_id,
+                                    self._start_time + intended_time,
+                                    id(tracing.getcurrent()), instance_id)
+
+    def ingest_records(self, records):
+        """
+        Store the START/FINISH records of runs executed elsewhere (see
+        shm_ring.RunRing.consume), in order.
+        """
+        steps = getattr(self.task_cls, "steps", ())
+        remote = self._remote_runs
+        columns = [records[f].tolist() for f in ("kind", "worker", "run_id",
+                                                 "time", "intended_time",
+                                                 "step", "run_time", "error",
+                                                 "timed_out")]
+        for kind, worker, run_id, t, intended, step, run_time, error, \
+                timed_out in itertools.izip(*columns):
+            if kind == shm_ring.START:
+                run = self._new_run(None if intended != intended else intended,
+                                    steps[step] if step >= 0 else None, t)
+                remote[(worker, run_id)] = run.id
+                continue
+            local_id = remote.pop((worker, run_id), None)
+            if local_id is None:
+                # its start was dropped from a full ring
+                continue
+            result = RunResult(local_id)
+            if error:
+                exc_type = shm_ring.remote_exception(error)
+                result.exc = (exc_type, exc_type())
+                result.timed_out = bool(timed_out)
+            else:
+                result.run_time = run_time
+            self.on_async_run_finished(result, t)
+
+    def run_seed(self, run_id):
+        """Seed of the run `run_id` in the schedule, None if not scheduled."""
+        if self.schedule is None or run_id >= len(self.schedule):
+            return None
+        return int(self.schedule.seeds[run_id])
+
+    def _register_instances(self, tasks):
+        self._instance_ids = dict((id(t), i) for i, t in enumerate(tasks))
 
     def runs_from_range(self, start=None, end=None):
-        if start is None:
-            start = 0
-        if end is None:
-            end = sys.maxint
-        return self._all_runs.slice_items(start, end)
+        """View of the runs started in [start, end), oldest first."""
+        return self._all_runs.range(start, end)
 
     def nr_running_runs(self):
         return len(self._running_runs)
 
+    def nr_workers(self):
+        """Threads/greenlets currently used by the executor. Extend me."""
+        return self.nr_running_runs()
+
     def nr_finished_runs(self):
         return len(self._finished_runs)
 
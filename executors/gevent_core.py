@@ -1,13 +1,60 @@
 import sys
+import time
 import logging
+import numpy
 import gevent
 from gevent.queue import Queue
-from gevent.pool import Pool
+from gevent.pool import Pool, Group
+from gevent.event import Event
 
-from .base import AbstractExecutor, run_task_func_wrapper
+from .base import AbstractExecutor, RunTimeout, run_task_func_wrapper
 
 log = logging.getLogger(__name__)
 
+# seconds between wake ups of the dispatcher
+TICK = 0.001
+
+
+class DispatchStats(object):
+    """How late the dispatcher woke up, and how many runs it spawned at once."""
+
+    def __init__(self):
+        self.ticks = 0
+        self.lag_sum = 0.0
+        self.lag_max = 0.0
+        self.batches = 0
+        self.runs = 0
+        self.batch_max = 0
+
+    def add_tick(self, lag):
+        self.ticks += 1
+        self.lag_sum += lag
+        self.lag_max = max(self.lag_max, lag)
+
+    def add_batch(self, n):
+        self.batches += 1
+        self.runs += n
+        self.batch_max = max(self.batch_max, n)
+
+    def to_dict(self):
+        return {"ticks": self.ticks,
+                "tick_lag_avg": self.lag_sum / self.ticks if self.ticks else 0.0,
+                "tick_lag_max": self.lag_max,
+                "batch_avg": self.runs / float(self.batches) if self.batches else 0.0,
+                "batch_max": self.batch_max}
+
+
+def _run_with_timeout(timeout, f, run_id, trace_ctx=None, args=(), seed=None):
+    if timeout is None:
+        return run_task_func_wrapper(f, run_id, trace_ctx, args, seed)
+    # RunTimeout is raised inside the task and recorded by the wrapper
+    t = gevent.Timeout.start_new(timeout, RunTimeout("Run timed out after %ss"
+                                                     % timeout))
+    try:
+        return run_task_func_wrapper(f, run_id, trace_ctx, args, seed)
+    finally:
+        t.cancel()
+
 
 class GeventExecutor(AbstractExecutor):
     def __init__(self, task_cls, max_threads, multiple_instances=False):
@@ -18,9 +65,11 @@ class GeventExecutor(AbstractExecutor):
             self._tasks_pool = Queue()
             for _ in xrange(max_threads):
                 self._tasks_pool.put(task_cls())
+            self._register_instances(self._tasks_pool.queue)
         else:
             self._task = task_cls()
         self._thread_pool = Pool(size=max_threads)
+        self.dispatch_stats = DispatchStats()
 
     def setup_tasks(self):
         if self._multiple_instances:
@@ -31,33 +80,169 @@ class GeventExecutor(AbstractExecutor):
 
     def join(self, timeout=sys.maxint):
         super(GeventExecutor, self).join()
-        self._thread_pool.join()
+        if not self._thread_pool.join(timeout=timeout):
+            log.warning("%d runs still running after %ss, killing them"
+                        % (len(self._thread_pool), timeout))
+            self._thread_pool.kill(block=True, timeout=1.0)
+
+    def nr_workers(self):
+        return len(self._thread_pool)
 
     def available(self):
-        is_it = not self._thread_pool.full()
-        #if not is_it:
-        #    gevent.sleep(0)
-        gevent.sleep(0)
-        return is_it
-
-    def wait_available(self):
-        gevent.sleep(0)
-        self._thread_pool.wait_available()
-
-    def _run_task(self, run_id):
-        self._thread_pool.apply_async(self._run_on_thread_pool, (run_id,))
+        return not self._thread_pool.full()
+
+    def wait_available(self, timeout=None):
+        # only yield to the hub when there's no free slot, dispatch() takes
+        # care of letting the workers run once per tick
+        if self._thread_pool.full():
+            self._thread_pool.wait_available(timeout)
+        return not self._thread_pool.full()
+
+    def dispatch(self, rate, start_time, duration, stop_check=lambda: False,
+                 tick=TICK):
+        """
+        Start runs at `rate(elapsed seconds)` runs per second from
+        `start_time` for `duration` seconds.
+
+        Instead of yielding to the hub after every run, the dispatcher wakes
+        up once per `tick` and spawns every run that became due since the
+        previous wake up, with evenly spaced intended times. When the hub is
+        late (busy workers), the next batch is bigger, so the achieved rate
+        keeps up with the target and the lateness shows as dispatch lag.
+        Runs are owed from the call on, not from `start_time`, so time spent
+        before (e.g. in setup) isn't dispatched in one burst.
+        """
+        last = time.time()
+        owed = 0.0
+        expected_wakeup = None
+        while True:
+            now = time.time()
+            if now - start_time >= duration or stop_check():
+                break
+            if expected_wakeup is not None:
+                self.dispatch_stats.add_tick(max(0.0, now - expected_wakeup))
+            owed += rate(now - start_time) * (now - last)
+            n = int(owed)
+            if n:
+                spacing = (now - last) / n
+                for i in xrange(n):
+                    while not self.wait_available(0.1):
+                        if stop_check():
+                            return
+                    self.async_run_task(last + (i+1) * spacing)
+                owed -= n
+                self.dispatch_stats.add_batch(n)
+            last = now
+            expected_wakeup = time.time() + tick
+            gevent.sleep(tick)
+
+    def dispatch_schedule(self, offsets, start_time, stop_check=lambda: False,
+                          tick=TICK):
+        """
+        Start a run at every `start_time` + offset of the sorted `offsets`,
+        spawning every run that became due once per `tick` as `dispatch`.
+        """
+        i = 0
+        expected_wakeup = None
+        while i < len(offsets) and not stop_check():
+            now = time.time()
+            if expected_wakeup is not None:
+                self.dispatch_stats.add_tick(max(0.0, now - expected_wakeup))
+            j = int(numpy.searchsorted(offsets, now - start_time, "right"))
+            for offset in offsets[i:j]:
+                while not self.wait_available(0.1):
+                    if stop_check():
+                        return
+                self.async_run_task(start_time + offset)
+            if j > i:
+                self.dispatch_stats.add_batch(j - i)
+            i = j
+            expected_wakeup = time.time() + tick
+            gevent.sleep(tick)
+
+    def _run_task(self, run_id, args=()):
+        self._thread_pool.apply_async(self._run_on_thread_pool, (run_id, args))
         #gevent.sleep(0)
 
-    def _run_on_thread_pool(self, run_id):
+    def _run_on_thread_pool(self, run_id, args=()):
         try:
             if self._multiple_instances:
                 try:
                     task = self._tasks_pool.get()
-                    result = run_task_func_wrapper(task.run, run_id)
+                    result = _run_with_timeout(self._timeout, task.run, run_id,
+                                               self.trace_context(run_id, task),
+                                               args, self.run_seed(run_id))
                 finally:
                     self._tasks_pool.put(task)
             else:
-                result = run_task_func_wrapper(self._task.run, run_id)
+                result = _run_with_timeout(self._timeout, self._task.run, run_id,
+                                           self.trace_context(run_id), args,
+                                           self.run_seed(run_id))
             self.on_async_run_finished(result)
         except:
             log.debug("DEUUU MEEERDA", exc_info=True)
+
+
+class GeventSessionExecutor(AbstractExecutor):
+    """Runs the virtual users of a `sessions.SessionTask` as greenlets."""
+
+    def __init__(self, task_cls):
+        super(GeventSessionExecutor, self).__init__(task_cls)
+        self._users = Group()
+        self._stop = Event()
+
+    def setup_tasks(self):
+        # every user sets up its own instance when it starts
+        if not self.task_cls.steps:
+            raise ValueError("Session task %s has no steps"
+                             % self.task_cls.__name__)
+
+    def run_sessions(self, duration, stop_check=lambda: False):
+        """Ramp up the users and keep them running for `duration` seconds."""
+        users = self.task_cls.users
+        ramp_up = self.task_cls.ramp_up
+        started = 0
+        while self.running_time < duration and not stop_check():
+            if ramp_up > 0:
+                due = min(users, int(users * self.running_time / ramp_up) + 1)
+            else:
+                due = users
+            while started < due:
+                self._users.spawn(self._user, started)
+                started += 1
+            gevent.sleep(0.01)
+        self._stop.set()
+
+    def _user(self, user_id):
+        task = self.task_cls()
+        self._instance_ids[id(task)] = user_id
+        try:
+            task.setup()
+            while not self._stop.is_set():
+                for step in self.task_cls.steps:
+                    run = self._new_run(step=step)
+                    result = _run_with_timeout(self._timeout, getattr(task, step),
+                                               run.id,
+                                               self.trace_context(run.id, task))
+                    self.on_async_run_finished(result)
+                    if self._stop.wait(task.next_think_time(step)):
+                        break
+        except:
+            log.debug("User %d crashed" % user_id, exc_info=True)
+
+    def join(self, timeout=sys.maxint):
+        super(GeventSessionExecutor, self).join()
+        self._stop.set()
+        if not self._users.join(timeout=timeout):
+            log.warning("%d users still running after %ss, killing them"
+                        % (len(self._users), timeout))
+            self._users.kill(block=True, timeout=1.0)
+
+    def nr_workers(self):
+        return len(self._users)
+
+    def available(self):
+        return True
+
+    def wait_available(self, timeout=None):
+        return True
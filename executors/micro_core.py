@@ -0,0 +1,94 @@
+import sys
+import logging
+import itertools
+from timeit import default_timer as _timer
+
+from .base import AbstractExecutor, RunResult
+
+log = logging.getLogger(__name__)
+
+# batches are calibrated from this many times shorter than the target
+_CALIBRATION_FACTOR = 10
+_OVERHEAD_REPEATS = 5
+
+
+def _timed_loop(f, n):
+    it = itertools.repeat(None, n)
+    start = _timer()
+    for _ in it:
+        f()
+    return _timer() - start
+
+
+def _empty_loop(n):
+    it = itertools.repeat(None, n)
+    start = _timer()
+    for _ in it:
+        pass
+    return _timer() - start
+
+
+class MicroExecutor(AbstractExecutor):
+    """
+    Calls `Task.run` in tight batches on the calling thread, for operations
+    too fast to be timed one by one. Every batch is recorded as one run
+    whose run time is the time per call: the batch time minus the empty
+    loop overhead, divided by the batch size. The spread across batches
+    gives the variance.
+
+    The batch size is calibrated at start so a batch takes about the task
+    `batch_time` seconds.
+    """
+
+    def __init__(self, task_cls, batch_time=0.01):
+        super(MicroExecutor, self).__init__(task_cls)
+        self.batch_time = batch_time
+        self.batch_size = None
+        # seconds of loop overhead per batch
+        self.loop_overhead = None
+        self._task = None
+
+    def setup_tasks(self):
+        self._task = self.task_cls()
+        self._task.setup()
+        self.calibrate()
+
+    def calibrate(self):
+        f = self._task.run
+        n = 1
+        elapsed = _timed_loop(f, n)
+        while elapsed < self.batch_time / _CALIBRATION_FACTOR:
+            n *= _CALIBRATION_FACTOR
+            elapsed = _timed_loop(f, n)
+        self.batch_size = max(1, int(n * self.batch_time / max(elapsed, 1e-9)))
+        self.loop_overhead = min(_empty_loop(self.batch_size)
+                                 for _ in xrange(_OVERHEAD_REPEATS))
+        log.debug("Batches of %d calls, %.1fns loop overhead per call"
+                  % (self.batch_size, self.loop_overhead / self.batch_size * 1e9))
+
+    def run_batches(self, duration, stop_check=lambda: False):
+        """Run batches for `duration` seconds."""
+        f = self._task.run
+        n = self.batch_size
+        while self.running_time < duration and not stop_check():
+            run = self._new_run()
+            result = RunResult(run.id)
+            try:
+                elapsed = _timed_loop(f, n)
+                result.run_time = max(0.0, elapsed - self.loop_overhead) / n
+            except Exception:
+                result.exc = sys.exc_info()[:2]
+            self.on_async_run_finished(result)
+
+    def join(self, timeout=None):
+        # batches run synchronously, nothing is left in flight
+        pass
+
+    def nr_workers(self):
+        return 1
+
+    def available(self):
+        return True
+
+    def wait_available(self, timeout=None):
+        return True
@@ -2,6 +2,7 @@ import sys
 import Queue
 import concurrent.futures
 import logging
+import time
 import threading
 from contextlib import contextmanager
 
@@ -53,6 +54,7 @@ class MultithreadingExecutor(AbstractExecutor):
         self._multiple_instances = multiple_instances
         if multiple_instances:
             self._tasks_pool = ObjectPool(task_cls, max_threads, init_size=max_threads)
+            self._register_instances(self._tasks_pool)
         else:
             self._task = task_cls()
         #self._thread_pool = concurrent.futures.ThreadPoolExecutor(max_threads)
@@ -60,6 +62,40 @@ class MultithreadingExecutor(AbstractExecutor):
         self._threads = []
         self._threads_counter = Counter(0, condition=True,
                                         condition_trigger=max_threads-1)
+        # runs holding a slot of _threads_counter
+        self._slots = set()
+        self._watchdog = None
+        self._finishing = False
+
+    def start(self):
+        super(MultithreadingExecutor, self).start()
+        if self._timeout is not None:
+            self._watchdog = threading.Thread(target=self._watch_timeouts)
+            self._watchdog.daemon = True
+            self._watchdog.start()
+
+    def finish(self):
+        super(MultithreadingExecutor, self).finish()
+        self._finishing = True
+
+    def _watch_timeouts(self):
+        # threads can't be interrupted: timed out runs are finished with a
+        # timeout result and their slot is given to a new run, while the
+        # stuck thread is left behind and its result ignored
+        interval = min(self._timeout / 10.0, 0.05)
+        while True:
+            for run_id in self.expire_runs():
+                self._release_slot(run_id)
+            if self._finishing and not self._running_runs:
+                break
+            time.sleep(interval)
+
+    def _release_slot(self, run_id):
+        with self._lock:
+            if run_id not in self._slots:
+                return
+            self._slots.remove(run_id)
+        self._threads_counter.dec()
 
     def setup_tasks(self):
         if self._multiple_instances:
@@ -73,32 +109,51 @@ class MultithreadingExecutor(AbstractExecutor):
         #concurrent.futures.wait(self._futures,
         #                        timeout=sys.maxint,
         #                        return_when=concurrent.futures.ALL_COMPLETED)
-        for t in self._threads:
-            t.join()
+        deadline = time.time() + timeout
+        for t in list(self._threads):
+            t.join(max(0.0, deadline - time.time()))
+        if self._threads:
+            log.warning("%d runs still running after %ss, leaving them behind"
+                        % (len(self._threads), timeout))
+
+    def nr_workers(self):
+        return len(self._threads)
 
     def available(self):
         return self._threads_counter < self._max_threads
 
-    def wait_available(self):
+    def wait_available(self, timeout=None):
         with self._threads_counter:
-            while self._threads_counter == self._max_threads:
-                self._threads_counter._condition.wait()
-
-    def _run_task(self, run_id):
+            if timeout is None:
+                while self._threads_counter == self._max_threads:
+                    self._threads_counter._condition.wait()
+            elif self._threads_counter == self._max_threads:
+                self._threads_counter._condition.wait(timeout)
+            return self._threads_counter < self._max_threads
+
+    def _run_task(self, run_id, args=()):
         #f = self._thread_pool.submit(self._run_on_thread_pool, run_id)
         #self._futures.append(f)
         self._threads_counter.inc()
-        t = threading.Thread(target=self._run_on_thread_pool, args=(run_id,))
+        with self._lock:
+            self._slots.add(run_id)
+        t = threading.Thread(target=self._run_on_thread_pool, args=(run_id, args))
+        # so runs left behind by a bounded join don't block the exit
+        t.daemon = True
         self._threads.append(t)
         t.start()
 
-    def _run_on_thread_pool(self, run_id):
+    def _run_on_thread_pool(self, run_id, args=()):
         def go(run_id):
             if self._multiple_instances:
                 with self._tasks_pool.get_context() as task:
-                    result = run_task_func_wrapper(task.run, run_id)
+                    result = run_task_func_wrapper(task.run, run_id,
+                                                   self.trace_context(run_id, task),
+                                                   args, self.run_seed(run_id))
             else:
-                result = run_task_func_wrapper(self._task.run, run_id)
+                result = run_task_func_wrapper(self._task.run, run_id,
+                                               self.trace_context(run_id), args,
+                                               self.run_seed(run_id))
             self.on_async_run_finished(result)
 
         try:
@@ -107,7 +162,7 @@ class MultithreadingExecutor(AbstractExecutor):
             log.debug("DEUUU MEEERDA", exc_info=True)
         finally:
             self._threads.remove(threading.current_thread())
-            self._threads_counter.dec()
+            self._release_slot(run_id)
 
 
 
@@ -0,0 +1,57 @@
+import logging
+
+from .base import AbstractExecutor
+
+log = logging.getLogger(__name__)
+
+
+class RemoteExecutor(AbstractExecutor):
+    """
+    Mirror, in the parent, of an executor running in a child process: it
+    runs nothing itself and stores the runs the child writes to its
+    shm_ring.RunRing, so stats and exports work as usual.
+    """
+
+    # attributes of some executors the child sends back when done, None
+    # (or missing, for dispatch_stats) until then
+    EXTRA_ATTRS = ("batch_size", "loop_overhead", "dispatch_stats")
+    batch_size = None
+    loop_overhead = None
+
+    def __init__(self, task_cls, ring):
+        super(RemoteExecutor, self).__init__(task_cls)
+        self._ring = ring
+
+    def setup_tasks(self):
+        pass
+
+    def start(self):
+        # started for real once the child has set its start time
+        pass
+
+    @property
+    def started(self):
+        return self._start_time is not None
+
+    @property
+    def running_time(self):
+        if self._start_time is None:
+            return 0.0
+        return super(RemoteExecutor, self).running_time
+
+    def drain(self):
+        """Store the runs written by the child since the last drain."""
+        if self._start_time is None:
+            self._start_time = self._ring.start_time
+            if self._start_time is None:
+                return 0
+        return self._ring.consume(self.ingest_records)
+
+    def join(self, timeout=None):
+        pass
+
+    def available(self):
+        return True
+
+    def wait_available(self, timeout=None):
+        return True
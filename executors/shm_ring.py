@@ -0,0 +1,152 @@
+"""
+Shared memory ring buffer of run records, to get runs from worker
+processes to the parent without pickling.
+
+A `RunRing` is an anonymous shared mmap created by the parent before
+forking: a small header (write and read counters, dropped records and the
+writer's start epoch) followed by `capacity` fixed size records of `RECORD_DTYPE`, accessed as a numpy
+structured array on both sides. Every ring has a single writer (one worker
+process) and a single reader (the parent), so no locks are needed: the
+writer fills a record before publishing it by bumping the write counter,
+and the reader hands out views of the published records and only then
+bumps the read counter.
+
+Workers write a START record when a run starts and a FINISH record when it
+ends; `AbstractExecutor.ingest_records` turns them into regular runs, so
+running runs, stats and exports work as with in-process executors. Times
+are epochs, the clock being shared by every process of the machine.
+"""
+import mmap
+import time
+import numpy
+
+START = 0
+FINISH = 1
+
+ERROR_SIZE = 40
+
+RECORD_DTYPE = numpy.dtype([("kind", numpy.uint8),
+                            ("failed", numpy.uint8),
+                            ("timed_out", numpy.uint8),
+                            # index in the task steps, -1 if none
+                            ("step", numpy.int8),
+                            ("worker", numpy.uint32),
+                            ("run_id", numpy.uint64),
+                            # start or finish epoch
+                            ("time", numpy.float64),
+                            ("intended_time", numpy.float64),
+                            ("run_time", numpy.float64),
+                            # exception class name of failed runs
+                            ("error", "S%d" % ERROR_SIZE)])
+
+# written, read and dropped counters, then the writer's start epoch
+_HEADER_SIZE = 64
+
+
+class WorkerRunError(Exception):
+    """Base of the exceptions of runs that failed in a worker process."""
+
+
+_remote_exceptions = {}
+
+
+def remote_exception(name):
+    """WorkerRunError subclass named like the worker exception `name`."""
+    cls = _remote_exceptions.get(name)
+    if cls is None:
+        cls = _remote_exceptions[name] = type(name, (WorkerRunError,), {})
+    return cls
+
+
+class RunRing(object):
+
+    CAPACITY = 65536
+
+    def __init__(self, capacity=CAPACITY, worker=0):
+        self.capacity = capacity
+        self.worker = worker
+        self._mmap = mmap.mmap(-1, _HEADER_SIZE + capacity * RECORD_DTYPE.itemsize)
+        self._counters = numpy.frombuffer(self._mmap, dtype=numpy.uint64,
+                                          count=3)
+        self._start_time = numpy.frombuffer(self._mmap, dtype=numpy.float64,
+                                            count=1, offset=24)
+        self._records = numpy.frombuffer(self._mmap, dtype=RECORD_DTYPE,
+                                         count=capacity, offset=_HEADER_SIZE)
+
+    @property
+    def start_time(self):
+        """Epoch at which the writer started, None until it's set."""
+        return float(self._start_time[0]) or None
+
+    @start_time.setter
+    def start_time(self, t):
+        self._start_time[0] = t
+
+    def __len__(self):
+        """Number of records written and not read yet."""
+        return int(self._counters[0] - self._counters[1])
+
+    @property
+    def dropped(self):
+        return int(self._counters[2])
+
+    def _write(self, record, timeout):
+        counters = self._counters
+        written = int(counters[0])
+        if written - int(counters[1]) >= self.capacity:
+            deadline = time.time() + timeout
+            while written - int(counters[1]) >= self.capacity:
+                if time.time() > deadline:
+                    counters[2] += 1
+                    return False
+                time.sleep(0.0005)
+        self._records[written % self.capacity] = record
+        # publish only once the record is complete
+        counters[0] = written + 1
+        return True
+
+    def write_start(self, run_id, start_time, intended_time=None, step=-1,
+                    timeout=1.0):
+        """
+        Record the start of a run. When the ring is full, waits up to
+        `timeout` seconds for the reader before dropping the record.
+        """
+        return self._write((START, 0, 0, step, self.worker, run_id, start_time,
+                            numpy.nan if intended_time is None else intended_time,
+                            numpy.nan, ""), timeout)
+
+    def write_finish(self, run_id, finish_time, result, timeout=1.0):
+        """Record the end of a run from its `RunResult`."""
+        error = ""
+        if result.exc is not None:
+            error = result.exc[0].__name__[:ERROR_SIZE]
+        run_time = numpy.nan if result.run_time is None else result.run_time
+        return self._write((FINISH, result.exc is not None, result.timed_out, -1,
+                            self.worker, run_id, finish_time, numpy.nan,
+                            run_time, error), timeout)
+
+    def consume(self, f):
+        """
+        Call `f` with views of the unread records, oldest first (two views
+        when they wrap around), then free them. The views are only valid
+        during the call. Returns the number of records read.
+        """
+        counters = self._counters
+        read = int(counters[1])
+        written = int(counters[0])
+        if written == read:
+            return 0
+        i = read % self.capacity
+        j = written % self.capacity
+        if i < j:
+            f(self._records[i:j])
+        else:
+            f(self._records[i:])
+            if j:
+                f(self._records[:j])
+        counters[1] = written
+        return written - read
+
+    def close(self):
+        self._counters = self._records = self._start_time = None
+        self._mmap.close()
@@ -0,0 +1,120 @@
+"""
+Data feeders: inputs for `Task.run` generated in bulk before the benchmark.
+
+A task with a `feeder` gets one item of it as the last argument of every
+run. Items are taken by the dispatcher, outside the timed section, and
+taking one is a couple of index operations over a pre-built list:
+
+    class Search(Task):
+        feeder = Feeder(random_query, size=100000, mode="random")
+
+        def run(self, query):
+            self.client.query(query)
+"""
+import csv
+import random
+import itertools
+import threading
+
+from .replay import iter_records
+
+MODES = ("circular", "random", "unique")
+# random indexes are drawn in blocks of this size
+RANDOM_BLOCK = 65536
+
+
+class FeederException(Exception):
+    pass
+
+
+class FeederExhausted(FeederException):
+    pass
+
+
+def csv_source(path, dialect="excel", header=True):
+    """Rows of a CSV file, as dicts if it has a header, else as lists."""
+    with open(path, "rb") as f:
+        if header:
+            for row in csv.DictReader(f, dialect=dialect):
+                yield row
+        else:
+            for row in csv.reader(f, dialect=dialect):
+                yield row
+
+
+def jsonl_source(path):
+    """Records of a JSON lines file, gzip'd or not."""
+    return iter_records(path)
+
+
+class Feeder(object):
+    """
+    `source` is an iterable (e.g. `csv_source`, `jsonl_source`, a list) or
+    a callable returning one item per call. At most `size` items are taken
+    from it (required for callables).
+
+    Modes:
+      circular  items in order, starting over at the end
+      random    items in random order, with replacement
+      unique    items in order, each one only once; raises FeederExhausted
+                when there are no items left
+    """
+
+    def __init__(self, source, size=None, mode="circular", seed=None):
+        if mode not in MODES:
+            raise FeederException("Invalid feeder mode `%s`" % mode)
+        if callable(source):
+            if size is None:
+                raise FeederException("A size is required for callable sources")
+            items = [source() for _ in xrange(size)]
+        else:
+            items = list(itertools.islice(source, size))
+        if not items:
+            raise FeederException("Empty feeder source")
+        self.mode = mode
+        self.seed = seed
+        self._items = items
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # itertools.count.next() is atomic, no locking needed in next()
+        self._counter = itertools.count()
+        if self.mode == "random":
+            self._new_random_block()
+
+    def _new_random_block(self):
+        n = len(self._items)
+        randrange = self._random.randrange
+        self._random_block = [randrange(n) for _ in xrange(RANDOM_BLOCK)]
+        self._random_used = itertools.count()
+
+    def __len__(self):
+        return len(self._items)
+
+    def next(self):
+        if self.mode == "circular":
+            return self._items[self._counter.next() % len(self._items)]
+        elif self.mode == "random":
+            block, used = self._random_block, self._random_used
+            i = used.next()
+            if i < RANDOM_BLOCK:
+                return self._items[block[i]]
+            with self._lock:
+                if self._random_used is used:
+                    self._new_random_block()
+            return self.next()
+        else:
+            i = self._counter.next()
+            if i >= len(self._items):
+                raise FeederExhausted()
+            return self._items[i]
+
+    def partition(self, index, count):
+        """
+        A new feeder with every `count`-th item starting at `index`, so
+        `count` workers get disjoint inputs.
+        """
+        seed = None if self.seed is None else hash((self.seed, index))
+        return Feeder(self._items[index::count], mode=self.mode, seed=seed)
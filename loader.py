@@ -1,18 +1,30 @@
 import inspect
 import logging
-from copy import copy
 
-from .task import Task
+from .task import Task, create_task_from_func
+from .sessions import SessionTask
+from .net import HTTPTask, TCPTask, _PooledTask
 
 log = logging.getLogger(__name__)
 
+# task bases of the library, never benchmarked themselves
+LIBRARY_BASES = (Task, SessionTask, _PooledTask, HTTPTask, TCPTask)
+
 def is_test_class(cls):
-    return inspect.isclass(cls) and cls != Task and Task in inspect.getmro(cls)
+    return (inspect.isclass(cls) and cls not in LIBRARY_BASES and
+            Task in inspect.getmro(cls))
+
+def _defined_in(module):
+    """Members of `module` defined there, not imported from elsewhere."""
+    return lambda obj: getattr(obj, "__module__", None) == module.__name__
+
+def is_test_func(obj):
+    return callable(obj) and is_test_class(getattr(obj, "pumba_task", None))
 
 def create_test_from_func(func):
-    t = copy.copy(Task)
-    t.run = func
-    return t
+    if is_test_func(func):
+        return func.pumba_task
+    return create_task_from_func(func)
 
 def hakuna_matata_load(obj):
     tests = []
@@ -23,7 +35,14 @@ def hakuna_matata_load(obj):
     elif is_test_class(obj):
         tests.append(obj)
     elif inspect.ismodule(obj):
-        tests.extend([t[1] for t in inspect.getmembers(obj, is_test_class)])
+        defined = _defined_in(obj)
+        tests.extend([t[1] for t in inspect.getmembers(obj, is_test_class)
+                      if defined(t[1])])
+        tests.extend([t[1].pumba_task
+                      for t in inspect.getmembers(obj, is_test_func)
+                      if defined(t[1])])
+    elif obj in LIBRARY_BASES:
+        log.debug("Skipping the library base %s" % obj.__name__)
     elif inspect.ismethod(obj) or inspect.isfunction(obj):
         tests.append(create_test_from_func(obj))
     else:
@@ -0,0 +1,169 @@
+"""
+Live metrics sinks.
+
+Sinks are fed by the benchmark report timer once per interval with the
+aggregated stats of the last interval, so they add nothing to the worker
+path. Pass them to `Benchmark(..., metrics_sinks=[...])`.
+"""
+from __future__ import division
+import re
+import socket
+import logging
+import threading
+import BaseHTTPServer
+
+log = logging.getLogger(__name__)
+
+
+def _metric_name(name):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def interval_metrics(stats, interval):
+    """Gauges for one interval from its `GeneralStats`."""
+    return (("rps", stats.submited_runs / interval),
+            ("finished_rps", stats.finished_runs / interval),
+            ("failed_rps", stats.failed_runs / interval),
+            ("failed_ratio", stats.failed_ratio),
+            ("timeout_rps", stats.timeout_runs / interval),
+            ("run_time_avg_seconds", stats.avg_run_time),
+            ("run_time_std_dev_seconds", stats.std_dev_run_time),
+            ("run_time_min_seconds", stats.min_run_time),
+            ("run_time_max_seconds", stats.max_run_time))
+
+
+class MetricsSink(object):
+
+    def start(self):
+        pass
+
+    def update(self, task_name, stats, interval, totals):
+        """
+        Called once per report interval.
+
+        `stats` are the `GeneralStats` of the last interval and `totals` a
+        dict of cumulative counters ("submited_runs", "finished_runs",
+        "running_runs").
+        """
+        raise NotImplementedError()
+
+    def stop(self):
+        pass
+
+
+class PrometheusSink(MetricsSink):
+    """Serves the latest metrics in Prometheus text format on /metrics."""
+    GAUGE_TOTALS = ("running_runs",)
+
+    def __init__(self, port=9876, host="127.0.0.1", prefix="pumba"):
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._tasks = {}
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        sink = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = sink.render()
+                self.send_response(200)
+                self.send_header("Content-Type",
+                                 "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = BaseHTTPServer.HTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        log.debug("Serving metrics on http://%s:%d/metrics" % (self.host, self.port))
+
+    def update(self, task_name, stats, interval, totals):
+        with self._lock:
+            self._tasks[task_name] = (interval_metrics(stats, interval), totals)
+
+    def render(self):
+        with self._lock:
+            tasks = sorted(self._tasks.items())
+        metrics = {}
+        for task_name, (gauges, totals) in tasks:
+            for name, value in gauges:
+                metrics.setdefault((name, "gauge"), []).append((task_name, value))
+            for name, value in totals.items():
+                kind = "gauge" if name in self.GAUGE_TOTALS else "counter"
+                metrics.setdefault((name, kind), []).append((task_name, value))
+
+        l = []
+        for (name, kind), values in sorted(metrics.items()):
+            full_name = "%s_%s" % (self.prefix, _metric_name(name))
+            if kind == "counter":
+                full_name += "_total"
+            l.append("# TYPE %s %s" % (full_name, kind))
+            for task_name, value in values:
+                l.append('%s{task="%s"} %r' % (full_name, task_name,
+                                                float(value)))
+        return "\n".join(l) + "\n"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class StatsDSink(MetricsSink):
+    """Sends the interval metrics as StatsD gauges over UDP."""
+
+    def __init__(self, host="127.0.0.1", port=8125, prefix="pumba"):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._sock = None
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def format(self, task_name, metrics, totals):
+        base = "%s.%s" % (self.prefix, _metric_name(task_name))
+        lines = ["%s.%s:%r|g" % (base, name, float(value))
+                 for name, value in metrics]
+        lines += ["%s.%s:%d|g" % (base, name, value)
+                  for name, value in sorted(totals.items())]
+        return lines
+
+    def update(self, task_name, stats, interval, totals):
+        lines = self.format(task_name, interval_metrics(stats, interval), totals)
+        try:
+            self._sock.sendto("\n".join(lines), self.address)
+        except socket.error:
+            log.debug("Failed to send metrics to %s:%d" % self.address,
+                      exc_info=True)
+
+    def stop(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+class InfluxLineSink(StatsDSink):
+    """Sends the interval metrics in InfluxDB line protocol over UDP."""
+
+    def __init__(self, host="127.0.0.1", port=8089, prefix="pumba"):
+        super(InfluxLineSink, self).__init__(host, port, prefix)
+
+    def format(self, task_name, metrics, totals):
+        fields = ["%s=%r" % (name, float(value)) for name, value in metrics]
+        fields += ["%s=%di" % (name, value) for name, value in sorted(totals.items())]
+        return ["%s,task=%s %s" % (self.prefix, _metric_name(task_name),
+                                   ",".join(fields))]
@@ -0,0 +1,330 @@
+"""
+Pooled network clients and task bases for HTTP/1.1 and raw TCP services.
+
+Every task instance keeps a pool of idle keep-alive connections, so with
+`multiple_instances` every worker has its own pool. Requests can be
+pipelined: several are written before reading the responses. Runs are
+traced by default and split their time in a "connect" phase (only when a
+new connection is opened) and a "response" phase, from the first byte
+sent to the last byte received.
+
+    class Search(HTTPTask):
+        host = "search.local"
+        port = 8080
+        max_threads = 100
+
+        def run(self, query):
+            r = self.request("GET", "/search?q=" + query)
+            if r.status != 200:
+                raise HTTPError(r.status)
+
+The clients use the standard socket module, so gevent tasks must
+monkey-patch it in setup(), as with any other client.
+"""
+import time
+import socket
+import threading
+from contextlib import contextmanager
+
+from .task import Task
+from . import tracing
+
+
+class ConnectionClosed(Exception):
+    """The peer closed the connection before a complete response."""
+
+
+class HTTPError(Exception):
+    pass
+
+
+class ConnectionPool(object):
+    """
+    Pool of idle connections made by `factory`, at most `size` of them
+    are kept. The most recently used connection is reused first.
+    """
+
+    def __init__(self, factory, size=10):
+        self.factory = factory
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        """(connection, reused)"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        start = time.time()
+        conn = self.factory()
+        conn.connect()
+        tracing.add_phase("connect", time.time() - start)
+        return conn, False
+
+    def put(self, conn):
+        if conn.closed:
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn, _ = self.get()
+        try:
+            yield conn
+        except:
+            conn.close()
+            raise
+        self.put(conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def __len__(self):
+        return len(self._idle)
+
+
+class _Connection(object):
+
+    def __init__(self, host, port, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.closed = True
+        self._sock = None
+        self._file = None
+
+    def connect(self):
+        self._sock = socket.create_connection((self.host, self.port),
+                                              self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rb")
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        if self._file is not None:
+            self._file.close()
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = self._file = None
+
+    def _readline(self):
+        line = self._file.readline()
+        if not line.endswith("\n"):
+            self.close()
+            raise ConnectionClosed()
+        return line
+
+    def _read(self, n):
+        data = self._file.read(n)
+        if len(data) < n:
+            self.close()
+            raise ConnectionClosed()
+        return data
+
+
+class TCPConnection(_Connection):
+    """
+    Request/response over raw TCP. Responses are framed either by a
+    `delimiter` (included in the returned data) or by a fixed `size`.
+    """
+
+    def __init__(self, host, port, timeout=10.0, delimiter="\n", size=None):
+        super(TCPConnection, self).__init__(host, port, timeout)
+        self.delimiter = delimiter
+        self.size = size
+
+    def _read_response(self):
+        if self.size is not None:
+            return self._read(self.size)
+        if self.delimiter == "\n":
+            return self._readline()
+        data = ""
+        while not data.endswith(self.delimiter):
+            c = self._file.read(1)
+            if not c:
+                self.close()
+                raise ConnectionClosed()
+            data += c
+        return data
+
+    def pipeline(self, requests):
+        """Send every request, then read one response per request."""
+        self._sock.sendall("".join(requests))
+        return [self._read_response() for _ in requests]
+
+    def request(self, data):
+        return self.pipeline([data])[0]
+
+
+class Response(object):
+
+    def __init__(self, status, reason, headers, body):
+        self.status = status
+        self.reason = reason
+        # lowercase names
+        self.headers = headers
+        self.body = body
+
+    def __repr__(self):
+        return "Response(%d %s, %d bytes)" % (self.status, self.reason,
+                                              len(self.body))
+
+
+class HTTPConnection(_Connection):
+    """Minimal HTTP/1.1 keep-alive client, with pipelining."""
+
+    def _encode(self, method, path, body=None, headers=None):
+        lines = ["%s %s HTTP/1.1" % (method, path),
+                 "Host: %s:%d" % (self.host, self.port)]
+        for name, value in (headers or {}).iteritems():
+            lines.append("%s: %s" % (name, value))
+        if body is not None or method in ("POST", "PUT", "PATCH"):
+            lines.append("Content-Length: %d" % len(body or ""))
+        return "\r\n".join(lines) + "\r\n\r\n" + (body or "")
+
+    def _read_response(self, method):
+        status_line = self._readline()
+        version, status, reason = (status_line.rstrip("\r\n").split(" ", 2) +
+                                   [""])[:3]
+        status = int(status)
+        headers = self._read_headers()
+
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            body = ""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self._readline().split(";", 1)[0], 16)
+                if size == 0:
+                    break
+                chunks.append(self._read(size))
+                self._readline()
+            # trailers
+            self._read_headers()
+            body = "".join(chunks)
+        elif "content-length" in headers:
+            body = self._read(int(headers["content-length"]))
+        else:
+            body = self._file.read()
+            self.close()
+
+        if headers.get("connection", "").lower() == "close" or \
+           (version == "HTTP/1.0" and
+            headers.get("connection", "").lower() != "keep-alive"):
+            self.close()
+        return Response(status, reason, headers, body)
+
+    def _read_headers(self):
+        headers = {}
+        while True:
+            line = self._readline().rstrip("\r\n")
+            if not line:
+                return headers
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    def pipeline(self, requests):
+        """
+        Send every request, a (method, path[, body[, headers]]) tuple, and
+        then read their responses.
+        """
+        self._sock.sendall("".join(self._encode(*r) for r in requests))
+        responses = []
+        for r in requests:
+            if self.closed:
+                raise ConnectionClosed()
+            responses.append(self._read_response(r[0]))
+        return responses
+
+    def request(self, method, path, body=None, headers=None):
+        return self.pipeline([(method, path, body, headers)])[0]
+
+
+class _PooledTask(Task):
+
+    # traced by default, for the connect/response split
+    trace = True
+    host = "127.0.0.1"
+    port = None
+    # idle connections kept per task instance
+    pool_size = 10
+    socket_timeout = 10.0
+
+    def setup(self):
+        self.pool = ConnectionPool(self.connection, self.pool_size)
+
+    def connection(self):
+        raise NotImplementedError()
+
+    def _pipeline(self, requests):
+        conn, reused = self.pool.get()
+        start = time.time()
+        try:
+            responses = conn.pipeline(requests)
+        except (socket.error, ConnectionClosed):
+            conn.close()
+            if not reused:
+                raise
+            # the server closed an idle keep-alive connection, retry once
+            conn, _ = self.pool.get()
+            start = time.time()
+            try:
+                responses = conn.pipeline(requests)
+            except:
+                conn.close()
+                raise
+        except:
+            conn.close()
+            raise
+        tracing.add_phase("response", time.time() - start)
+        self.pool.put(conn)
+        return responses
+
+
+class HTTPTask(_PooledTask):
+
+    port = 80
+    path = "/"
+
+    def connection(self):
+        return HTTPConnection(self.host, self.port, self.socket_timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        return self._pipeline([(method, path, body, headers)])[0]
+
+    def pipeline(self, requests):
+        """Pipeline (method, path[, body[, headers]]) requests."""
+        return self._pipeline(requests)
+
+    def run(self):
+        r = self.request("GET", self.path)
+        if r.status >= 400:
+            raise HTTPError("%d %s" % (r.status, r.reason))
+
+
+class TCPTask(_PooledTask):
+
+    delimiter = "\n"
+    # fixed response size, instead of a delimiter
+    response_size = None
+
+    def connection(self):
+        return TCPConnection(self.host, self.port, self.socket_timeout,
+                             self.delimiter, self.response_size)
+
+    def request(self, data):
+        return self._pipeline([data])[0]
+
+    def pipeline(self, requests):
+        return self._pipeline(requests)
+
+    def run(self, data="ping\n"):
+        self.request(data)
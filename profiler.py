@@ -0,0 +1,85 @@
+"""
+In-process sampling profiler.
+
+Samples the stacks of the running process `hz` times per second and counts
+them in collapsed-stack format ("outer;...;inner count" per line), which can
+be fed to flamegraph.pl or speedscope. Enable it for a task with
+`profile_hz`; when it's not set nothing is installed at all.
+
+Two sampling modes:
+  thread  a background thread reads the stacks of every other thread, the
+          default, good for the threaded executor
+  signal  SIGPROF interrupts the main thread on CPU time, which under gevent
+          is the stack of the greenlet that's running
+"""
+import os
+import sys
+import time
+import signal
+import threading
+from collections import defaultdict
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return "%s (%s)" % (code.co_name, os.path.basename(code.co_filename))
+
+
+def collapse(frame):
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class SamplingProfiler(object):
+
+    def __init__(self, hz=100, mode="thread"):
+        if mode not in ("thread", "signal"):
+            raise ValueError("Invalid profiler mode `%s`" % mode)
+        self.hz = hz
+        self.mode = mode
+        self.stacks = defaultdict(int)
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._old_handler = None
+
+    def start(self):
+        if self.mode == "thread":
+            self._thread = threading.Thread(target=self._sample_threads)
+            self._thread.daemon = True
+            self._thread.start()
+        else:
+            self._old_handler = signal.signal(signal.SIGPROF, self._on_signal)
+            signal.setitimer(signal.ITIMER_PROF, 1.0 / self.hz, 1.0 / self.hz)
+        return self
+
+    def stop(self):
+        if self.mode == "thread":
+            self._stop.set()
+            if self._thread is not None:
+                self._thread.join()
+        else:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, self._old_handler or signal.SIG_DFL)
+
+    def _sample_threads(self):
+        interval = 1.0 / self.hz
+        me = threading.current_thread().ident
+        while not self._stop.is_set():
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self.stacks[collapse(frame)] += 1
+            self.samples += 1
+            time.sleep(interval)
+
+    def _on_signal(self, signum, frame):
+        self.stacks[collapse(frame)] += 1
+        self.samples += 1
+
+    def write_collapsed(self, path):
+        with open(path, "w") as f:
+            for stack, count in sorted(self.stacks.iteritems()):
+                f.write("%s %d\n" % (stack, count))
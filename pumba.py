@@ -1,39 +1,137 @@
 from __future__ import absolute_import
 
+import os
+import sys
 import argparse
 import logging
 import importlib
 
 from .loader import hakuna_matata_load
 from .benchmark import Benchmark
+from . import compare
+from . import metrics
+from . import autotune
+from . import catalog
+from .summary import Assertion, AssertionParseError, check_assertions, \
+                    write_summary
 
 log = logging.getLogger(__name__)
 
-def main():
+COMMANDS = {"compare": compare.main,
+            "history": catalog.main}
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+
     parser = argparse.ArgumentParser()
     parser.add_argument("module",
                         help="module name where the tasks are located")
     parser.add_argument("-d", "--duration", type=float, default=10.0)
     parser.add_argument("-v", "--verbose", action="store_true")
-    args = parser.parse_args()
+    parser.add_argument("--prometheus-port", type=int, default=None,
+                        help="serve live metrics in prometheus format")
+    parser.add_argument("--statsd", default=None, metavar="HOST:PORT",
+                        help="send live metrics to a statsd server")
+    parser.add_argument("-o", "--output", default="pumba_results",
+                        help="directory to export the results to")
+    parser.add_argument("--no-export", action="store_true",
+                        help="don't export the results")
+    parser.add_argument("--headless", action="store_true",
+                        help="no live table, only warnings are logged")
+    parser.add_argument("--summary", default=None, metavar="PATH",
+                        help="write a JSON summary to PATH, - for stdout")
+    parser.add_argument("--assert", dest="assertions", action="append",
+                        default=[], metavar="EXPR",
+                        help="SLO to check, e.g. \"p99 < 250ms\"; exits "
+                             "with status 1 if any fails")
+    parser.add_argument("--autotune", choices=("recommend", "apply"),
+                        default=None,
+                        help="try every executor and concurrency level first "
+                             "and print the best, or benchmark with it")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="dispatch from a deterministic schedule of "
+                             "this seed, see schedule.py")
+    parser.add_argument("--schedule", default=None, metavar="DIR",
+                        help="re-run the schedules exported to DIR")
+    parser.add_argument("--parallel", action="store_true",
+                        help="benchmark every task of the module at the same "
+                             "time, each in its own process")
+    parser.add_argument("--no-pin", action="store_true",
+                        help="with --parallel, don't pin each process to its "
+                             "own CPUs")
+    args = parser.parse_args(argv)
+
+    try:
+        assertions = [Assertion(a) for a in args.assertions]
+    except AssertionParseError as e:
+        parser.error(str(e))
 
     logging.basicConfig(level=logging.CRITICAL)
     level = logging.DEBUG if args.verbose else logging.WARNING
-    level = logging.DEBUG
     logging.getLogger(__name__).setLevel(level)
     logging.getLogger("pumba").setLevel(level)
 
     module = importlib.import_module(args.module)
     tasks = hakuna_matata_load(module)
-    benchmark = Benchmark(tasks[0],
+
+    if not args.parallel:
+        tasks = tasks[:1]
+    for task in tasks:
+        if args.seed is not None:
+            task.seed = args.seed
+        if args.schedule is not None:
+            path = os.path.join(args.schedule, "schedule.%s.npz" % task.__name__)
+            if not os.path.exists(path):
+                parser.error("No schedule for %s in %s" % (task.__name__,
+                                                           args.schedule))
+            task.schedule_file = path
+    if args.autotune is not None:
+        for i, task in enumerate(tasks):
+            best, trials = autotune.autotune(task)
+            print autotune.format_trials(task.__name__, best, trials)
+            if best is not None:
+                tasks[i] = autotune.tuned_task(task, best.executor,
+                                               best.max_threads)
+        if args.autotune == "recommend":
+            return 0
+
+    sinks = []
+    if args.prometheus_port is not None:
+        sinks.append(metrics.PrometheusSink(args.prometheus_port))
+    if args.statsd is not None:
+        host, port = args.statsd.rsplit(":", 1)
+        sinks.append(metrics.StatsDSink(host, int(port)))
+
+    benchmark = Benchmark(tasks,
                           duration=args.duration,
-                          terminal=not args.verbose)
-    benchmark.start()
-    #benchmark.export("/Users/pedro/pumba/myresults10", sample_frequency=10)
-    #benchmark.export("/Users/pedro/pumba/myresults50", sample_frequency=50)
-    #benchmark.export("/Users/pedro/pumba/myresults100", sample_frequency=100)
-    benchmark.export("/Users/pedro/pumba/myresults")
-    benchmark.export("/Users/pedro/pumba/myresults1", sample_frequency=1)
+                          terminal=not (args.verbose or args.headless),
+                          metrics_sinks=sinks,
+                          parallel=args.parallel,
+                          pin_cpus=not args.no_pin)
+    try:
+        benchmark.start()
+    except KeyboardInterrupt:
+        log.warning("Interrupted, exporting the results collected so far")
+    if not args.no_export:
+        path = benchmark.export(args.output)
+        print >>sys.stderr, "Results exported to %s" % path
+
+    summary = benchmark.summary()
+    if args.summary is not None:
+        write_summary(summary, args.summary)
+
+    failures = check_assertions(summary, assertions)
+    for assertion, target, actual in failures:
+        print >>sys.stderr, "FAILED %s: %s = %s" % (assertion.expression,
+                                                    target, actual)
+    if failures:
+        return 1
+    if assertions:
+        print >>sys.stderr, "All %d assertions passed" % len(assertions)
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
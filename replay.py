@@ -0,0 +1,87 @@
+"""
+Replay of recorded request logs.
+
+A request log is a JSON lines file (optionally gzip'd), one request per line,
+each with a timestamp field (epoch seconds). Every record is passed to
+`Task.run(record)` at its timestamp relative to the first record.
+"""
+import gzip
+import json
+import logging
+import threading
+import Queue
+
+log = logging.getLogger(__name__)
+
+_END = object()
+
+
+def iter_records(path):
+    """Lazily yields the records of a JSON lines file, gzip'd or not."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+class ReplayReader(object):
+    """
+    Iterates over (offset, record) of a request log, `offset` being the
+    seconds since the first record divided by `speed`.
+
+    Records are parsed ahead by a background thread into a bounded queue of
+    `prefetch` records so file I/O never delays the dispatcher.
+    """
+
+    def __init__(self, path, time_field="timestamp", speed=1.0, prefetch=10000):
+        self.path = path
+        self.time_field = time_field
+        self.speed = speed
+        self._queue = Queue.Queue(maxsize=prefetch)
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._read)
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _read(self):
+        try:
+            first = None
+            for record in iter_records(self.path):
+                t = float(record[self.time_field])
+                if first is None:
+                    first = t
+                item = ((t - first) / self.speed, record)
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put(item, timeout=0.1)
+                        break
+                    except Queue.Full:
+                        pass
+                if self._stop.is_set():
+                    break
+        except Exception as e:
+            log.error("Failed reading request log %s" % self.path, exc_info=True)
+            self._error = e
+        finally:
+            if not self._stop.is_set():
+                self._queue.put(_END)
+
+    def __iter__(self):
+        if not self._thread.is_alive() and not self._thread.ident:
+            self.start()
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                break
+            yield item
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,157 @@
+"""
+Client side resource usage, sampled every report interval, to tell when the
+load generator itself is the bottleneck. Only uses /proc (with portable
+fallbacks) and the `gc` module.
+"""
+from __future__ import division
+import os
+import gc
+import time
+import resource
+import threading
+from collections import namedtuple
+
+ResourceSample = namedtuple("ResourceSample", ("time",
+                                               "cpu",
+                                               "rss",
+                                               "gc_collections",
+                                               "gc_pause",
+                                               "threads",
+                                               "workers",
+                                               "running_runs",
+                                               "dispatch_lag_avg",
+                                               "dispatch_lag_max",
+                                               "saturated"))
+
+# one core is all a single python process can use (GIL)
+CPU_SATURATION = 0.9
+# seconds runs may start late before the dispatcher is considered behind
+DISPATCH_LAG_SATURATION = 0.05
+
+
+def is_saturated(cpu, lag_avg, lag_max):
+    # the dispatcher busy-waits between runs, so high CPU alone is normal;
+    # it only means saturation once runs start being late
+    return lag_avg >= DISPATCH_LAG_SATURATION or \
+           (cpu >= CPU_SATURATION and lag_max >= DISPATCH_LAG_SATURATION)
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = resource.getpagesize()
+
+
+def cpu_time():
+    """User + system CPU seconds used by this process."""
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    except (IOError, IndexError, ValueError):
+        t = os.times()
+        return t[0] + t[1]
+
+
+def rss():
+    """Resident set size of this process, in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (IOError, IndexError, ValueError):
+        # peak, not current, but the best there is without /proc
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _GCMonitor(object):
+    """
+    Counts collections and the time spent in them, where gc.callbacks
+    exists (python 3.3+).
+    """
+
+    def __init__(self):
+        self.pause = 0.0
+        self._start = None
+        self.collections = 0
+        if hasattr(gc, "callbacks"):
+            gc.callbacks.append(self._callback)
+
+    def _callback(self, phase, info):
+        if phase == "start":
+            self._start = time.time()
+        elif self._start is not None:
+            self.pause += time.time() - self._start
+            self.collections += 1
+            self._start = None
+
+    def sample(self):
+        """
+        (collections, pause seconds) since the last sample, (None, None)
+        without gc.callbacks: gc.get_count() can't tell how many
+        collections ran.
+        """
+        if not hasattr(gc, "callbacks"):
+            return None, None
+        collections, pause = self.collections, self.pause
+        self.collections, self.pause = 0, 0.0
+        return collections, pause
+
+    def close(self):
+        if hasattr(gc, "callbacks") and self._callback in gc.callbacks:
+            gc.callbacks.remove(self._callback)
+
+
+class ResourceSampler(object):
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.samples = []
+        self._gc = _GCMonitor()
+        self._last_time = None
+        self._last_cpu = None
+
+    def start(self):
+        self._last_time = time.time()
+        self._last_cpu = cpu_time()
+
+    def sample(self):
+        now = time.time()
+        cpu = cpu_time()
+        wall = now - self._last_time
+        cpu_usage = (cpu - self._last_cpu) / wall if wall > 0 else 0.0
+        running_time = now - self.executor._start_time
+        lag_avg, lag_max = self._dispatch_lag(running_time - wall, running_time)
+        collections, gc_pause = self._gc.sample()
+        sample = ResourceSample(time=running_time,
+                                cpu=cpu_usage,
+                                rss=rss(),
+                                gc_collections=collections,
+                                gc_pause=gc_pause,
+                                threads=threading.active_count(),
+                                workers=self.executor.nr_workers(),
+                                running_runs=self.executor.nr_running_runs(),
+                                dispatch_lag_avg=lag_avg,
+                                dispatch_lag_max=lag_max,
+                                saturated=is_saturated(cpu_usage, lag_avg,
+                                                       lag_max))
+        self.samples.append(sample)
+        self._last_time, self._last_cpu = now, cpu
+        return sample
+
+    def _dispatch_lag(self, start_time, end_time):
+        total = 0.0
+        n = 0
+        max_lag = 0.0
+        for run in self.executor.runs_from_range(max(0.0, start_time), end_time):
+            if run.intended_time is None:
+                continue
+            lag = max(0.0, run.start_time - run.intended_time)
+            total += lag
+            n += 1
+            max_lag = max(max_lag, lag)
+        return (total / n if n else 0.0), max_lag
+
+    def stop(self):
+        self._gc.close()
+
+    def saturated_intervals(self, interval):
+        """(start, end) of the intervals where the generator was saturated."""
+        return [(max(0.0, s.time - interval), s.time)
+                for s in self.samples if s.saturated]
@@ -1,3 +1,4 @@
 from threading import Event
 
+# set to stop every running benchmark as soon as possible, e.g. on SIGINT
 exit = Event()
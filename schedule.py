@@ -0,0 +1,120 @@
+"""
+Deterministic load schedules, to re-run a benchmark with the identical
+arrival pattern.
+
+A task with a `seed` isn't dispatched from the live load loop: its arrival
+times are precomputed from the seed for the whole duration, following the
+task load (`rate` or the default ramp), either as a Poisson process or
+evenly spaced. Every run also gets its own seed, derived from the task
+seed, and `run_random()` returns a `random.Random` of that seed, safe to
+use from concurrent runs. Only `run_random()` is deterministic: the global
+`random` module is left alone, as concurrent runs would share its state.
+
+    class Search(Task):
+        seed = 42
+        rate = 200
+
+        def run(self):
+            query = schedule.run_random().choice(QUERIES)
+
+The schedule is exported next to the results (schedule.<task>.npz). Setting
+`schedule_file` to it, or `pumba --schedule <export dir>`, replays the same
+arrivals and run seeds, and since run ids are the schedule indexes, runs of
+both benchmarks can be compared one by one (`pumba compare --paired`).
+"""
+import random
+import numpy
+from greenlet import getcurrent
+
+ARRIVALS = ("poisson", "uniform")
+# max points of the grid the load is integrated over
+_MAX_GRID = 100000
+
+# run seeded random.Random by greenlet, as tracing contexts
+_randoms = {}
+
+
+class ScheduleException(Exception):
+    pass
+
+
+class Schedule(object):
+    """
+    Arrival `offsets` (seconds since the dispatch start) and the `seeds`
+    of the runs, run i being the i-th arrival.
+    """
+
+    def __init__(self, offsets, seeds, seed=None, arrivals=None):
+        self.offsets = numpy.asarray(offsets, dtype=numpy.float64)
+        self.seeds = numpy.asarray(seeds, dtype=numpy.int64)
+        if len(self.offsets) != len(self.seeds):
+            raise ScheduleException("%d offsets but %d seeds"
+                                    % (len(self.offsets), len(self.seeds)))
+        self.seed = seed
+        self.arrivals = arrivals
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @classmethod
+    def generate(cls, rate, duration, seed, arrivals="poisson"):
+        """
+        Schedule of `duration` seconds at `rate(elapsed seconds)` runs per
+        second. Poisson arrivals are exponential gaps of a unit rate
+        process, mapped through the cumulative load so the rate can vary.
+        """
+        if arrivals not in ARRIVALS:
+            raise ScheduleException("Unknown arrivals `%s`" % arrivals)
+        n = int(min(_MAX_GRID, max(1000, duration * 1000)))
+        grid = numpy.linspace(0.0, duration, n+1)
+        rates = numpy.array([rate(t) for t in grid], dtype=numpy.float64)
+        load = numpy.concatenate(([0.0], numpy.cumsum(
+            (rates[1:] + rates[:-1]) / 2 * numpy.diff(grid))))
+        total = load[-1]
+
+        if arrivals == "poisson":
+            rng = numpy.random.RandomState([seed, 0])
+            points = numpy.cumsum(rng.exponential(
+                1.0, int(total + 10 * numpy.sqrt(total) + 10)))
+            while len(points) and points[-1] < total:
+                more = numpy.cumsum(rng.exponential(1.0, len(points)))
+                points = numpy.concatenate((points, points[-1] + more))
+            points = points[points < total]
+        else:
+            points = numpy.arange(1.0, total)
+        offsets = numpy.interp(points, load, grid)
+        seeds = numpy.random.RandomState([seed, 1]).randint(
+            0, 2**31 - 1, len(offsets))
+        return cls(offsets, seeds, seed, arrivals)
+
+    def save(self, path):
+        numpy.savez(path, offsets=self.offsets, seeds=self.seeds,
+                    seed=numpy.int64(-1 if self.seed is None else self.seed),
+                    arrivals=numpy.array(self.arrivals or ""))
+
+    @classmethod
+    def load(cls, path):
+        with numpy.load(path) as f:
+            seed = int(f["seed"])
+            return cls(f["offsets"], f["seeds"], None if seed < 0 else seed,
+                       str(f["arrivals"]) or None)
+
+    def to_dict(self):
+        return {"seed": self.seed, "arrivals": self.arrivals, "runs": len(self)}
+
+
+def bind_seed(seed):
+    """Seed the run being executed in this greenlet/thread."""
+    _randoms[getcurrent()] = random.Random(seed)
+
+
+def unbind_seed():
+    _randoms.pop(getcurrent(), None)
+
+
+def run_random():
+    """
+    `random.Random` seeded with the seed of the run being executed, the
+    global `random` module outside of scheduled runs.
+    """
+    return _randoms.get(getcurrent(), random)
@@ -0,0 +1,51 @@
+"""
+Closed-loop virtual user sessions.
+
+Instead of independent runs at a target rate, a `SessionTask` simulates
+`users` virtual users, started evenly over `ramp_up` seconds. Each user has
+its own task instance and repeatedly goes through `steps`, waiting a think
+time after every step. Every step is recorded as a run, so stats are
+available per step:
+
+    class Shop(SessionTask):
+        users = 10000
+        ramp_up = 60.0
+        steps = ("login", "browse", "buy")
+        think_time = (1.0, 5.0)
+
+        def setup(self):
+            gevent.monkey.patch_all()
+            self.client = ShopClient()
+
+        def login(self):
+            ...
+
+Users are greenlets, so idle users only cost their task instance and a
+small greenlet stack.
+"""
+import random
+
+from .task import Task
+
+
+class SessionTask(Task):
+
+    executor = "sessions"
+    users = 100
+    ramp_up = 0.0
+    steps = ()
+    # seconds after each step: a number, a (min, max) tuple for a uniform
+    # distribution or ("exponential", mean). Override next_think_time()
+    # for anything else.
+    think_time = 0.0
+
+    def next_think_time(self, step):
+        t = self.think_time
+        if type(t) not in (list, tuple):
+            return t
+        if t[0] == "exponential":
+            return random.expovariate(1.0 / t[1])
+        return random.uniform(t[0], t[1])
+
+    def run(self):
+        raise NotImplementedError("Session tasks run their steps")
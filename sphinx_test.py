@@ -7,6 +7,7 @@ from buzz_search import buzz_sphinx
 buzz_sphinx.TIMEOUT = 2.0
 #from buzz_search.buzz_sphinx import BuzzSphinxClientPool, BuzzSphinxClient
 from .task import Task
+from .feeders import Feeder
 
 def random_query(size=3):
     return "".join([random.choice(string.letters) for i in xrange(size)])
@@ -17,12 +18,13 @@ class SphinxThreading(object):
     executor = "multithreading"
     max_threads = 1000
     multiple_instances = True
+    feeder = Feeder(random_query, size=100000, mode="random")
 
     def setup(self):
         self.p = buzz_sphinx.BuzzSphinxClient("localhost", 9312)
 
-    def run(self):
-        r = self.p.query(random_query())
+    def run(self, query):
+        r = self.p.query(query)
 
 
 class SphinxGevent(Task):
@@ -31,10 +33,11 @@ class SphinxGevent(Task):
     executor = "gevent"
     max_threads = 5000
     multiple_instances = True
+    feeder = Feeder(random_query, size=100000, mode="random")
 
     def setup(self):
         gevent.monkey.patch_all()
         self.p = buzz_sphinx.BuzzSphinxClient("localhost", 9312)
 
-    def run(self):
-        r = self.p.query(random_query())
+    def run(self, query):
+        r = self.p.query(query)
@@ -0,0 +1,111 @@
+"""
+Local stand-in servers to try network tasks against without a real
+service: a line echo server and a keep-alive HTTP/1.1 server, both
+answering pipelined requests in order.
+
+    server = HTTPStandIn(delay=0.01).start()
+    class Local(HTTPTask):
+        port = server.port
+"""
+import time
+import socket
+import threading
+import SocketServer
+
+
+class _Server(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _StandIn(object):
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0):
+        self.delay = delay
+        stand_in = self
+
+        class Handler(SocketServer.StreamRequestHandler):
+            def handle(self):
+                self.connection.setsockopt(socket.IPPROTO_TCP,
+                                           socket.TCP_NODELAY, 1)
+                try:
+                    stand_in.handle(self.rfile, self.wfile)
+                except socket.error:
+                    pass
+
+        self._server = _Server((host, port), Handler)
+        self.host, self.port = self._server.server_address
+        self._thread = None
+
+    def handle(self, rfile, wfile):
+        raise NotImplementedError()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={"poll_interval": 0.1})
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class EchoStandIn(_StandIn):
+    """Echoes every line back, after `delay` seconds."""
+
+    def handle(self, rfile, wfile):
+        for line in iter(rfile.readline, ""):
+            if self.delay:
+                time.sleep(self.delay)
+            wfile.write(line)
+            wfile.flush()
+
+
+class HTTPStandIn(_StandIn):
+    """
+    Answers every request with `status` and `body` after `delay` seconds,
+    keeping the connection alive unless the client asks otherwise.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0, status=200,
+                 body="OK"):
+        super(HTTPStandIn, self).__init__(host, port, delay)
+        self.status = status
+        self.body = body
+
+    def handle(self, rfile, wfile):
+        while True:
+            request_line = rfile.readline()
+            if not request_line.strip():
+                return
+            headers = {}
+            for line in iter(rfile.readline, ""):
+                line = line.rstrip("\r\n")
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if "content-length" in headers:
+                rfile.read(int(headers["content-length"]))
+            if self.delay:
+                time.sleep(self.delay)
+            close = headers.get("connection", "").lower() == "close"
+            # HEAD responses have the headers of a GET, without the body
+            head = request_line.split(" ", 1)[0] == "HEAD"
+            wfile.write("HTTP/1.1 %d Stand-in\r\nContent-Length: %d\r\n%s\r\n%s"
+                        % (self.status, len(self.body),
+                           "Connection: close\r\n" if close else "",
+                           "" if head else self.body))
+            wfile.flush()
+            if close:
+                return
@@ -13,6 +13,7 @@ GeneralStats = namedtuple("GeneralStats", ("submited_runs",
                                            "finished_runs",
                                            "failed_runs",
                                            "failed_ratio",
+                                           "timeout_runs",
                                            "avg_run_time",
                                            "std_dev_run_time",
                                            "min_run_time",
@@ -21,60 +22,320 @@ GeneralStats = namedtuple("GeneralStats", ("submited_runs",
 def _ratio(a, b, default=0.0):
     return a/b if b != 0 else default
 
+
+class RunStats(object):
+    """
+    Mergeable accumulator of run stats: counts, min/max, mean and variance
+    of the successful run times (Welford's update, Chan's parallel merge,
+    so tiny latencies don't lose precision like a sum of squares does) and
+    a sparse log-bucketed histogram for percentiles within
+    HIST_GROWTH - 1 relative error.
+
+    Accumulators of different intervals, threads, processes or agents are
+    combined with `merge` (or +), and `to_dict` is a compact JSON-able
+    form. Without `histogram` only the moments are kept, for the hot paths
+    that don't need percentiles.
+    """
+
+    HIST_MIN = 1e-9
+    HIST_GROWTH = 1.01
+    _LOG_GROWTH = math.log(HIST_GROWTH)
+
+    def __init__(self, histogram=True):
+        self.submited = 0
+        self.finished = 0
+        self.failed = 0
+        self.timeouts = 0
+        # successful runs
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        # bucket index -> count, None without histogram
+        self.histogram = {} if histogram else None
+
+    @classmethod
+    def _bucket(cls, run_time):
+        if run_time <= cls.HIST_MIN:
+            return 0
+        return int(math.log(run_time / cls.HIST_MIN) / cls._LOG_GROWTH) + 1
+
+    @classmethod
+    def _bucket_value(cls, bucket):
+        if bucket == 0:
+            return cls.HIST_MIN
+        # geometric middle of the bucket
+        return cls.HIST_MIN * cls.HIST_GROWTH ** (bucket - 0.5)
+
+    def add(self, run_time):
+        """Add a successful run."""
+        self.finished += 1
+        self.count += 1
+        delta = run_time - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (run_time - self.mean)
+        if run_time < self.min:
+            self.min = run_time
+        if run_time > self.max:
+            self.max = run_time
+        if self.histogram is not None:
+            b = self._bucket(run_time)
+            self.histogram[b] = self.histogram.get(b, 0) + 1
+
+    def add_failed(self, timed_out=False):
+        self.finished += 1
+        self.failed += 1
+        self.timeouts += bool(timed_out)
+
+    def add_run(self, run):
+        """Add a `Run`, finished or not."""
+        self.submited += 1
+        if run.finished:
+            if run.result.exc is None:
+                self.add(run.result.run_time)
+            else:
+                self.add_failed(run.result.timed_out)
+
+    def add_many(self, run_times):
+        """Add an array of successful run times at once."""
+        run_times = numpy.asarray(run_times, dtype=numpy.float64)
+        if not len(run_times):
+            return
+        other = RunStats()
+        other.finished = other.count = len(run_times)
+        other.mean = run_times.mean()
+        other.m2 = ((run_times - other.mean)**2).sum()
+        other.min = run_times.min()
+        other.max = run_times.max()
+        if self.histogram is None:
+            self.merge(other)
+            return
+        buckets = numpy.zeros(len(run_times), dtype=numpy.intp)
+        above = run_times > self.HIST_MIN
+        buckets[above] = (numpy.log(run_times[above] / self.HIST_MIN) /
+                          self._LOG_GROWTH).astype(numpy.intp) + 1
+        counts = numpy.bincount(buckets)
+        nonzero = numpy.nonzero(counts)[0]
+        other.histogram = dict(zip(nonzero.tolist(), counts[nonzero].tolist()))
+        self.merge(other)
+
+    def merge(self, other):
+        """Add the runs of `other` to these stats."""
+        self.submited += other.submited
+        self.finished += other.finished
+        self.failed += other.failed
+        self.timeouts += other.timeouts
+        n = self.count + other.count
+        if other.count:
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / n
+            self.m2 += other.m2 + delta**2 * self.count * other.count / n
+            self.count = n
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            if self.histogram is not None:
+                # merging stats without histogram leaves it incomplete
+                for b, c in (other.histogram or {}).iteritems():
+                    self.histogram[b] = self.histogram.get(b, 0) + c
+        return self
+
+    def __add__(self, other):
+        return RunStats(self.histogram is not None and
+                        other.histogram is not None).merge(self).merge(other)
+
+    @property
+    def std_dev(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def percentile(self, p):
+        """Approximate `p` percentile (0-100) of the successful run times."""
+        if self.histogram is None:
+            raise ValueError("Percentiles need stats with a histogram")
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for b in sorted(self.histogram):
+            seen += self.histogram[b]
+            if seen >= rank:
+                return min(max(self._bucket_value(b), self.min), self.max)
+        return self.max
+
+    def to_general_stats(self):
+        return GeneralStats(submited_runs=self.submited,
+                            finished_runs=self.finished,
+                            failed_runs=self.failed,
+                            failed_ratio=_ratio(self.failed, self.finished),
+                            timeout_runs=self.timeouts,
+                            avg_run_time=self.mean,
+                            std_dev_run_time=self.std_dev,
+                            min_run_time=self.min if self.count else 0.0,
+                            max_run_time=self.max)
+
+    def to_dict(self):
+        return {"submited": self.submited,
+                "finished": self.finished,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "count": self.count,
+                "mean": self.mean,
+                "m2": self.m2,
+                "min": self.min if self.count else None,
+                "max": self.max,
+                # [bucket, count, bucket, count, ...]
+                "histogram": None if self.histogram is None else
+                             [x for b in sorted(self.histogram)
+                              for x in (b, self.histogram[b])]}
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls()
+        for f in ("submited", "finished", "failed", "timeouts", "count", "mean",
+                  "m2", "max"):
+            setattr(s, f, d[f])
+        if d["min"] is not None:
+            s.min = d["min"]
+        h = d["histogram"]
+        s.histogram = None if h is None else dict(zip(h[::2], h[1::2]))
+        return s
+
+    def __repr__(self):
+        return "RunStats(%d runs, %d ok, mean=%r)" % (self.submited, self.count,
+                                                      self.mean)
+
+
+def runs_arrays(runs):
+    """
+    Columns of `runs` as numpy arrays: start_time, finish_time (NaN for
+    unfinished runs), run_time (NaN for failed or unfinished runs), failed
+    and run_id.
+    """
+    if not hasattr(runs, "__len__"):
+        runs = list(runs)
+    run_id = numpy.empty(len(runs), dtype=numpy.int64)
+    start_time = numpy.empty(len(runs), dtype=numpy.float64)
+    finish_time = numpy.empty(len(runs), dtype=numpy.float64)
+    run_time = numpy.empty(len(runs), dtype=numpy.float64)
+    failed = numpy.zeros(len(runs), dtype=numpy.bool_)
+    for i, r in enumerate(runs):
+        run_id[i] = r.id
+        start_time[i] = r.start_time
+        if r.finished:
+            finish_time[i] = r.finish_time
+        else:
+            finish_time[i] = numpy.nan
+        if r.finished and r.result.exc is None:
+            run_time[i] = r.result.run_time
+        else:
+            run_time[i] = numpy.nan
+            failed[i] = r.finished
+    return {"start_time": start_time, "finish_time": finish_time,
+            "run_time": run_time, "failed": failed, "run_id": run_id}
+
+
+def in_flight(start_time, finish_time, step, n):
+    """
+    Average and peak number of runs in flight in each of `n` buckets of
+    `step` seconds, sweeping over the start (+1) and finish (-1) events.
+    Unfinished runs (NaN finish time) stay in flight until the end.
+
+    The average over a bucket is what Little's law calls L (= throughput *
+    average run time).
+    """
+    end = n*step
+    finish_time = numpy.where(numpy.isnan(finish_time), end, finish_time)
+    times = numpy.concatenate((start_time, finish_time))
+    if len(times) == 0:
+        return numpy.zeros(n), numpy.zeros(n)
+    deltas = numpy.concatenate((numpy.ones(len(start_time)),
+                                -numpy.ones(len(finish_time))))
+    order = numpy.argsort(times, kind="mergesort")
+    t = times[order]
+    level = numpy.cumsum(deltas[order])
+    # integral of the level from the first event up to every event
+    area = numpy.concatenate(([0.0], numpy.cumsum(level[:-1] * numpy.diff(t))))
+
+    edges = numpy.arange(n+1) * step
+    k = numpy.searchsorted(t, edges, side="right") - 1
+    before = k < 0
+    k = numpy.maximum(k, 0)
+    level_at = numpy.where(before, 0.0, level[k])
+    area_at = numpy.where(before, 0.0, area[k] + level[k]*(edges - t[k]))
+    avg = numpy.diff(area_at) / step
+
+    peak = level_at[:-1].copy()
+    idx = numpy.floor(t / step).astype(numpy.intp)
+    inside = (idx >= 0) & (idx < n)
+    numpy.maximum.at(peak, idx[inside], level[inside])
+    return avg, peak
+
+
 class Stats(object):
     def __init__(self, executor):
         self.executor = executor
 
     def general_stats(self, start_time=None, end_time=None):
+        if start_time is None and end_time is None:
+            # kept up to date by the executor, no need to go through the runs
+            return self.executor.totals.to_general_stats()
         runs = self.executor.runs_from_range(start_time, end_time)
         return self._calc_stats(runs)
 
     def _calc_stats(self, runs):
-        # standart deviation formula when mean is not known:
-        # std_dev = sqrt((sum(xi**2) - (sum(xi)**2)/n) / (n-1))
-        sum_run_time = 0
-        sum_power_run_time = 0
-        count_runs = 0
-        count_failed = 0
-        count_finished = 0
-        min_time = sys.maxint
-        max_time = 0.0
+        # GeneralStats has no percentiles
+        stats = RunStats(histogram=False)
+        run_times = []
         for r in runs:
-            count_runs += 1
+            stats.submited += 1
             if r.finished:
-                count_finished += 1
-                if r.result.exc is not None:
-                    count_failed += 1
+                if r.result.exc is None:
+                    run_times.append(r.result.run_time)
                 else:
-                    sum_run_time += r.result.run_time
-                    sum_power_run_time += r.result.run_time**2
-                    min_time = min(min_time, r.result.run_time)
-                    max_time = max(max_time, r.result.run_time)
-
-        if min_time == sys.maxint:
-            min_time = 0.0
+                    stats.add_failed(r.result.timed_out)
+        stats.add_many(run_times)
+        return stats.to_general_stats()
 
-        if count_finished <= 1:
-            std_dev = 0.0
-        else:
-            std_dev = math.sqrt((sum_power_run_time - (sum_run_time**2)/count_finished) / (count_finished-1))
+    def runs_arrays(self, start_time=None, end_time=None, step=None):
+        runs = self.executor.runs_from_range(start_time, end_time)
+        if step is not None:
+            return runs_arrays([r for r in runs if r.step == step])
+        arrays = runs_arrays(runs)
+        # the index keys are the start times, read straight from its chunks
+        arrays["start_time"] = runs.keys()
+        return arrays
 
-        return GeneralStats(submited_runs=count_runs,
-                            finished_runs=count_finished,
-                            failed_runs=count_failed,
-                            failed_ratio=_ratio(count_failed, count_finished),
-                            avg_run_time=_ratio(sum_run_time, count_finished),
-                            std_dev_run_time=std_dev,
-                            min_run_time=min_time,
-                            max_run_time=max_time,
-                            )
+    def phases_stats(self, start_time=None, end_time=None,
+                     percentiles=(50, 99)):
+        """
+        phase -> (runs, avg, percentiles...) of the time traced runs spent
+        in every phase (see tracing.add_phase).
+        """
+        times = {}
+        for r in self.executor.runs_from_range(start_time, end_time):
+            if r.finished and r.result.trace is not None:
+                for phase, t in r.result.trace.phases.iteritems():
+                    times.setdefault(phase, []).append(t)
+        stats = {}
+        for phase, t in times.iteritems():
+            t = numpy.array(t)
+            stats[phase] = ((len(t), t.mean()) +
+                            tuple(numpy.percentile(t, percentiles)))
+        return stats
 
+    def steps_stats(self, start_time=None, end_time=None):
+        """(step, GeneralStats) for every step of a session task."""
+        steps = getattr(self.executor.task_cls, "steps", ())
+        if not steps:
+            return []
+        runs = self.executor.runs_from_range(start_time, end_time)
+        return [(step, self._calc_stats(r for r in runs if r.step == step))
+                for step in steps]
 
     def intervals_stats(self, step, start_time, end_time):
         stats = []
         for i in numpy.arange(start_time, end_time, step):
-            runs = self.executor._all_runs.slice_items(i,
-                                                       i+step)
+            runs = self.executor.runs_from_range(i, i+step)
             stats.append((i, self._calc_stats(runs)))
         return stats
 
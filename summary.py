@@ -0,0 +1,199 @@
+"""
+Machine-readable summary of a benchmark and SLO assertions on it, for
+running benchmarks as regression gates in CI:
+
+    pumba my_tasks -d 60 --headless --summary summary.json \\
+        --assert "p99 < 250ms" --assert "error_rate < 0.01" \\
+        --assert "Login/login:throughput >= 100"
+
+An assertion is `[task[/phase]:]metric op value`. Without a task it applies
+to every task. Metrics are the numeric fields of a task (or phase) summary
+and of its "latency" dict; latencies are in seconds unless the value has a
+"ms" suffix, and ratios accept a "%" suffix.
+"""
+from __future__ import division
+import re
+import json
+import operator
+from collections import Counter
+
+import numpy
+
+from .stats import runs_arrays
+
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+OPERATORS = {"<": operator.lt,
+             "<=": operator.le,
+             ">": operator.gt,
+             ">=": operator.ge,
+             "==": operator.eq,
+             "!=": operator.ne}
+
+_ASSERTION_RE = re.compile(r"^\s*(?:(?P<target>[^:<>=!]+):)?\s*(?P<metric>[\w.]+)\s*"
+                           r"(?P<op><=|>=|==|!=|<|>)\s*"
+                           r"(?P<value>[-+0-9.eE]+)\s*(?P<unit>ms|s|%)?\s*$")
+
+
+class AssertionParseError(ValueError):
+    pass
+
+
+def _percentile_name(p):
+    return "p%s" % ("%g" % p).replace(".", "")
+
+
+def _runs_summary(runs, window):
+    """Counts, throughput, latency percentiles and errors of `runs`."""
+    runs = list(runs)
+    arrays = runs_arrays(runs)
+    run_time = arrays["run_time"]
+    ok = run_time[~numpy.isnan(run_time)]
+    finished = int(arrays["failed"].sum()) + len(ok)
+    errors = Counter(r.result.exc[0].__name__ for r in runs
+                     if r.finished and r.result.exc is not None)
+    timeouts = sum(1 for r in runs if r.finished and r.result.timed_out)
+
+    latency = {}
+    if len(ok):
+        latency["min_run_time"] = float(ok.min())
+        latency["avg_run_time"] = float(ok.mean())
+        latency["max_run_time"] = float(ok.max())
+        latency["std_dev_run_time"] = float(ok.std(ddof=1)) if len(ok) > 1 else 0.0
+        for p, v in zip(PERCENTILES, numpy.percentile(ok, PERCENTILES)):
+            latency[_percentile_name(p)] = float(v)
+
+    failed = finished - len(ok)
+    return {"submited_runs": len(runs),
+            "finished_runs": finished,
+            "failed_runs": failed,
+            "timeout_runs": timeouts,
+            "error_rate": failed / finished if finished else 0.0,
+            "throughput": len(ok) / window if window else 0.0,
+            "latency": latency,
+            "errors": dict(errors)}
+
+
+def task_summary(b):
+    """Summary of a finished `_SingleBenchmark`."""
+    executor = b._executor
+    window = b.dispatch_time or b.duration
+    runs = list(executor.runs_from_range())
+    d = _runs_summary(runs, window)
+    d["duration"] = window
+
+    steps = getattr(b.task, "steps", ())
+    if steps:
+        d["phases"] = dict((step, _runs_summary((r for r in runs if r.step == step),
+                                                window))
+                           for step in steps)
+
+    phases = executor.stats.phases_stats(percentiles=(50, 99))
+    if phases:
+        d["timings"] = dict((phase, {"runs": n, "avg": avg, "p50": p50, "p99": p99})
+                            for phase, (n, avg, p50, p99) in phases.iteritems())
+
+    if hasattr(executor, "dispatch_stats"):
+        d["dispatch"] = executor.dispatch_stats.to_dict()
+
+    if b.schedule is not None:
+        d["schedule"] = b.schedule.to_dict()
+
+    if b.task.executor == "micro" and executor.batch_size:
+        # runs are batches, with the time per call as run time
+        avg = d["latency"].get("avg_run_time")
+        d["micro"] = {"batch_size": executor.batch_size,
+                      "loop_overhead": executor.loop_overhead / executor.batch_size,
+                      "calls_per_second": 1.0 / avg if avg else None}
+
+    samples = b.resources.samples
+    d["client"] = {
+        "cpu_avg": (sum(s.cpu for s in samples) / len(samples)
+                    if samples else None),
+        "rss_max": max(s.rss for s in samples) if samples else None,
+        "saturated_intervals": sum(1 for s in samples if s.saturated)}
+    return d
+
+
+def benchmark_summary(benchmark):
+    """Summary of every task of `benchmark` that has run."""
+    return {"duration": benchmark.duration,
+            "stopped": benchmark.stopped,
+            "tasks": dict((b.task.__name__, task_summary(b))
+                          for b in benchmark._benchmarks
+                          if b._executor is not None)}
+
+
+def write_summary(summary, path):
+    """Write `summary` as JSON to `path`, "-" for stdout."""
+    s = json.dumps(summary, indent=2, sort_keys=True)
+    if path == "-":
+        print s
+    else:
+        with open(path, "w") as f:
+            f.write(s + "\n")
+
+
+class Assertion(object):
+
+    def __init__(self, expression):
+        m = _ASSERTION_RE.match(expression)
+        if m is None:
+            raise AssertionParseError("Invalid assertion `%s`" % expression)
+        self.expression = expression.strip()
+        target = m.group("target")
+        if target:
+            target = target.strip().split("/", 1)
+            self.task = target[0]
+            self.phase = target[1] if len(target) > 1 else None
+        else:
+            self.task = self.phase = None
+        self.metric = m.group("metric")
+        self.op = m.group("op")
+        self.value = float(m.group("value"))
+        unit = m.group("unit")
+        if unit == "ms":
+            self.value /= 1000
+        elif unit == "%":
+            self.value /= 100
+
+    def check(self, summary):
+        """List of (target, actual value) where the assertion fails."""
+        failures = []
+        tasks = summary["tasks"]
+        if self.task is not None and self.task not in tasks:
+            return [(self.task, None)]
+        for task_name in sorted(tasks):
+            if self.task is not None and task_name != self.task:
+                continue
+            d = tasks[task_name]
+            target = task_name
+            if self.phase is not None:
+                target = "%s/%s" % (task_name, self.phase)
+                d = d.get("phases", {}).get(self.phase)
+                if d is None:
+                    failures.append((target, None))
+                    continue
+            if self.metric in d:
+                actual = d[self.metric]
+            else:
+                actual = d["latency"].get(self.metric)
+            # a missing value (e.g. latency without successful runs) fails
+            if actual is None or not OPERATORS[self.op](actual, self.value):
+                failures.append((target, actual))
+        return failures
+
+    def __repr__(self):
+        return "Assertion(%r)" % self.expression
+
+
+def check_assertions(summary, assertions):
+    """
+    Check every assertion against `summary`. Returns a list of
+    (assertion, target, actual value) failures, empty if all passed.
+    """
+    failures = []
+    for a in assertions:
+        for target, actual in a.check(summary):
+            failures.append((a, target, actual))
+    return failures
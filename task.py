@@ -1,11 +1,133 @@
+import sys
+import inspect
+import logging
+
+log = logging.getLogger(__name__)
+
+
 class Task(object):
 
     executor = "multithreading"
     max_threads = 5
     multiple_instances = False
+    # seconds after which a run is recorded as timed out and its slot freed
+    timeout = None
+    # max seconds to wait for in-flight runs when the benchmark ends
+    drain_timeout = 10.0
+    # expose a tracing.TraceContext for every run through tracing.current()
+    trace = False
+    # number of slowest runs kept per 100ms for the traces export
+    slow_runs = 5
+    # constant runs per second to dispatch, instead of the default ramp
+    rate = None
+    # JSON lines request log (optionally gzip'd) to replay instead of the
+    # default load ramp. Each record is passed to run() at its timestamp
+    # relative to the first one, `replay_speed` times faster.
+    replay_log = None
+    replay_time_field = "timestamp"
+    replay_speed = 1.0
+    # feeders.Feeder whose items are passed as the last argument of run()
+    feeder = None
+    # samples per second of the profiler.SamplingProfiler, None to disable
+    profile_hz = None
+    profile_mode = "thread"
+    # micro executor: seconds per timed batch of runs
+    batch_time = 0.01
+    # seed of a deterministic schedule of "poisson" or "uniform" arrivals,
+    # precomputed instead of dispatching live, see schedule.py
+    seed = None
+    arrivals = "poisson"
+    # exported schedule (schedule.<task>.npz) to dispatch from instead
+    schedule_file = None
 
     def setup(self):
         pass
 
     def run(self):
-        raise NotImplemented()
\ No newline at end of file
+        raise NotImplemented()
+
+
+class _GeneratorTask(Task):
+    """
+    Task of a generator function: the code before the first `yield` is the
+    setup, and every run resumes the generator up to its next `yield`. The
+    argument of the run, if any (a feeder item or a replayed record), is
+    the value of that `yield` expression.
+
+    An exception raised in the generator (a timeout included) aborts the
+    current iteration and ends the generator, so the run fails and a new
+    generator is started, setup part included, for the following runs.
+    """
+
+    multiple_instances = True
+    _generator_func = None
+
+    def setup(self):
+        self._start()
+
+    def _start(self):
+        generator = self._generator_func()
+        next(generator)
+        self._generator = generator
+        if self.feeder is None and self.replay_log is None:
+            self._resume = generator.next
+        elif self.feeder is None or self.replay_log is None:
+            self._resume = generator.send
+        else:
+            self._resume = lambda *args: generator.send(args)
+
+    def run(self, *args):
+        if self._generator is None:
+            # restarting after the previous failure failed too
+            self._start()
+        try:
+            return self._resume(*args)
+        except Exception:
+            exc_info = sys.exc_info()
+            self._generator = None
+            try:
+                self._start()
+            except Exception:
+                log.debug("Restarting generator task %s failed"
+                          % type(self).__name__, exc_info=True)
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+
+def create_task_from_func(func, **settings):
+    """
+    New Task class running `func`, with `settings` overriding the Task
+    class attributes. Generator functions get one generator per task
+    instance, see `_GeneratorTask`.
+    """
+    for name in settings:
+        if name in ("setup", "run") or not hasattr(Task, name):
+            raise TypeError("Unknown task setting `%s`" % name)
+    attrs = dict(settings, __module__=func.__module__, __doc__=func.__doc__)
+    if inspect.isgeneratorfunction(func):
+        if not attrs.get("multiple_instances", True):
+            raise ValueError("Generator tasks need multiple_instances, a "
+                             "generator can only run once at a time")
+        attrs["_generator_func"] = staticmethod(func)
+        return type(func.__name__, (_GeneratorTask,), attrs)
+    attrs["run"] = staticmethod(func)
+    return type(func.__name__, (Task,), attrs)
+
+
+def task(func=None, **settings):
+    """
+    Decorator to load a function as a task, with `settings` overriding the
+    Task class attributes:
+
+        @task(executor="gevent", max_threads=100)
+        def get_user(user_id):
+            client.get_user(user_id)
+
+    The function is returned unchanged and can still be called directly;
+    the Task class is in its `pumba_task` attribute.
+    """
+    def decorate(func):
+        func.pumba_task = create_task_from_func(func, **settings)
+        return func
+    if func is None:
+        return decorate
+    return decorate(func)
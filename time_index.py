@@ -0,0 +1,129 @@
+from bisect import bisect_left
+from array import array
+import itertools
+import numpy
+
+
+class TimeIndex(object):
+    '''Append-only sequence of items indexed by a non-decreasing time key.
+
+    Keys live in fixed size array('d') chunks next to lists of items, so an
+    append is O(1) amortized and never moves existing data. Lookups bisect
+    the first key of every chunk and then inside a single chunk, and
+    range() returns a view over the chunks instead of copying the items.
+
+    It's meant for a single writer (the dispatcher) with concurrent
+    readers. Keys lower than the last one (e.g. the clock going back) are
+    stored as the last key.
+
+    >>> idx = TimeIndex(chunk_size=2)
+    >>> for t in (0.5, 1.0, 1.0, 2.5, 3.0):
+    ...     idx.append(t, "run@%s" % t)
+    >>> list(idx.range(1.0, 3.0))
+    ['run@1.0', 'run@1.0', 'run@2.5']
+    >>> len(idx.range(1.0))
+    4
+    >>> idx.range(0.0, 2.0).keys()
+    array([0.5, 1. , 1. ])
+    '''
+
+    CHUNK_SIZE = 4096
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self._chunk_size = chunk_size
+        self._keys = []
+        self._items = []
+        # first key of every chunk
+        self._firsts = []
+        self._len = 0
+        self._last_key = float("-inf")
+
+    def append(self, key, item):
+        if key < self._last_key:
+            key = self._last_key
+        if not self._firsts or len(self._keys[-1]) == self._chunk_size:
+            # items and keys must always be at least as long as what
+            # readers can find through _firsts and _keys
+            self._items.append([])
+            self._keys.append(array("d"))
+            self._firsts.append(key)
+        self._items[-1].append(item)
+        self._keys[-1].append(key)
+        self._len += 1
+        self._last_key = key
+
+    def _position(self, key):
+        """(chunk, offset) of the first item with a key >= `key`."""
+        chunk = max(0, bisect_left(self._firsts, key) - 1)
+        if chunk >= len(self._firsts):
+            return chunk, 0
+        offset = bisect_left(self._keys[chunk], key)
+        if offset == len(self._keys[chunk]) and chunk+1 < len(self._firsts):
+            return chunk+1, 0
+        return chunk, offset
+
+    def range(self, start=None, end=None):
+        """View of the items with start <= key < end."""
+        n_chunks = len(self._firsts)
+        if start is None:
+            first = (0, 0)
+        else:
+            first = self._position(start)
+        if end is None:
+            # not _keys[-1]: append() opens a chunk in _keys before _firsts
+            last = (n_chunks-1, len(self._keys[n_chunks-1])) if n_chunks else (0, 0)
+        else:
+            last = self._position(end)
+        if last < first:
+            last = first
+        return TimeIndexView(self, first, last)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return iter(self.range())
+
+    def __repr__(self):
+        return "TimeIndex(%d items)" % self._len
+
+
+class TimeIndexView(object):
+    '''Items of a TimeIndex between two (chunk, offset) positions.'''
+
+    def __init__(self, index, first, last):
+        self._index = index
+        self._first = first
+        self._last = last
+
+    def _slices(self):
+        (c0, o0), (c1, o1) = self._first, self._last
+        for c in xrange(c0, c1+1):
+            start = o0 if c == c0 else 0
+            end = o1 if c == c1 else self._index._chunk_size
+            if end > start:
+                yield c, start, end
+
+    def __len__(self):
+        return sum(end - start for _, start, end in self._slices())
+
+    def __iter__(self):
+        items = self._index._items
+        return itertools.chain.from_iterable(
+            itertools.islice(items[c], start, end)
+            for c, start, end in self._slices())
+
+    def keys(self):
+        """The keys as a float64 numpy array."""
+        keys = self._index._keys
+        size = self._index._chunk_size
+        parts = []
+        for c, start, end in self._slices():
+            if len(keys[c]) == size:
+                # full chunks never change again, so no copy is needed
+                parts.append(numpy.frombuffer(keys[c], dtype=numpy.float64)[start:end])
+            else:
+                parts.append(numpy.array(keys[c][start:end], dtype=numpy.float64))
+        if not parts:
+            return numpy.empty(0, dtype=numpy.float64)
+        return numpy.concatenate(parts)
@@ -0,0 +1,121 @@
+"""
+Per-run trace context and slow runs tracking.
+
+Tasks with `trace = True` can get the context of the run being executed
+with `current()` and inject it in their requests, e.g.:
+
+    def run(self):
+        ctx = tracing.current()
+        self.client.get("/", headers={"X-Request-Id": ctx.request_id})
+
+Runs can also split their time in named phases (e.g. connect/response)
+with `add_phase()`, summarized by `Stats.phases_stats()`.
+"""
+import os
+import heapq
+import binascii
+from greenlet import getcurrent
+
+# contexts of the runs being executed, by greenlet. Each thread has its own
+# main greenlet, so this works both for the threaded and gevent executors.
+_contexts = {}
+
+
+class TraceContext(object):
+    __slots__ = ("prefix", "run_id", "intended_start", "start", "worker_id",
+                 "instance_id", "phases")
+
+    def __init__(self, prefix, run_id, intended_start, worker_id, instance_id):
+        self.prefix = prefix
+        self.run_id = run_id
+        # epoch timestamps, so runs can be matched against server logs
+        self.intended_start = intended_start
+        self.start = None
+        self.worker_id = worker_id
+        self.instance_id = instance_id
+        # phase name -> seconds
+        self.phases = {}
+
+    @property
+    def request_id(self):
+        return "%s-%d" % (self.prefix, self.run_id)
+
+    def to_dict(self):
+        d = {"request_id": self.request_id,
+             "run_id": self.run_id,
+             "intended_start": self.intended_start,
+             "start": self.start,
+             "worker_id": self.worker_id,
+             "instance_id": self.instance_id}
+        if self.phases:
+            d["phases"] = self.phases
+        return d
+
+    def __repr__(self):
+        return "TraceContext(%s)" % self.request_id
+
+
+def new_prefix():
+    """Random prefix for the request ids of one benchmark."""
+    return binascii.hexlify(os.urandom(4))
+
+
+def current():
+    """Trace context of the run being executed, or None."""
+    return _contexts.get(getcurrent())
+
+
+def bind(ctx):
+    _contexts[getcurrent()] = ctx
+
+
+def unbind():
+    _contexts.pop(getcurrent(), None)
+
+
+def add_phase(name, seconds):
+    """Add `seconds` to the phase `name` of the current run, if traced."""
+    ctx = _contexts.get(getcurrent())
+    if ctx is not None:
+        ctx.phases[name] = ctx.phases.get(name, 0.0) + seconds
+
+
+class SlowRuns(object):
+    """
+    Keeps the `k` slowest successful runs of every `interval` seconds
+    (by start time) in bounded min-heaps, so adding a run is O(log k).
+    """
+
+    def __init__(self, k=5, interval=0.1):
+        self.k = k
+        self.interval = interval
+        self._heaps = {}
+
+    def add(self, run):
+        heap = self._heaps.setdefault(int(run.start_time / self.interval), [])
+        # heapq's C implementation holds the GIL for the whole push, and
+        # items are plain tuples, so no lock is needed between workers
+        item = (run.result.run_time, run.id, run)
+        if len(heap) < self.k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heappushpop(heap, item)
+
+    def slowest(self, start_time, end_time, k=None):
+        """The `k` slowest runs started in [start_time, end_time), slowest first."""
+        if k is None:
+            k = self.k
+        first = int(start_time / self.interval)
+        last = int(end_time / self.interval)
+        items = []
+        for i in xrange(first, last+1):
+            items.extend(it for it in self._heaps.get(i, ())
+                         if start_time <= it[2].start_time < end_time)
+        return [it[2] for it in heapq.nlargest(k, items)]
+
+    def intervals(self, step, start_time, end_time, k=None):
+        """(interval start, slowest runs) for every `step` seconds."""
+        i = start_time
+        while i < end_time:
+            yield i, self.slowest(i, i+step, k)
+            i += step